@@ -1,5 +1,6 @@
 import jwt
 
+from dataclasses import dataclass
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta, timezone
@@ -9,8 +10,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from app.cache import TTLCache
 from app.models.users import User as UserModel
 from app.config import SECRET_KEY, ALGORITHM
+from app.password_hashing import password_hashing_pool
 from app.db_depends import get_async_db
 from app.db_depends import get_db
 
@@ -21,6 +24,19 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 40
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/token")
 
+# Активность пользователей по ID: отключённый пользователь теряет доступ не позже чем через ttl секунд
+user_active_cache = TTLCache(maxsize=10000, ttl=60, name="user_active")
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """
+    Аутентифицированный пользователь по подписанным данным JWT, без загрузки из базы.
+    """
+    id: int
+    email: str
+    role: str
+
 
 def hash_password(password: str) -> str:
     """
@@ -36,6 +52,20 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def hash_password_async(password: str) -> str:
+    """
+    hash_password в пуле потоков: не блокирует цикл событий.
+    """
+    return await password_hashing_pool.run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    verify_password в пуле потоков: не блокирует цикл событий.
+    """
+    return await password_hashing_pool.run(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict):
     """
     Создаёт JWT с payload (sub, role, id, exp).
@@ -59,12 +89,25 @@ def create_refresh_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+async def _is_user_active(db: AsyncSession, user_id: int) -> bool:
+    """
+    Активен ли пользователь; ответ кэшируется в user_active_cache.
+    """
+    is_active = user_active_cache.get(user_id)
+    if is_active is None:
+        is_active = bool(await db.scalar(select(UserModel.is_active).where(UserModel.id == user_id)))
+        user_active_cache.set(user_id, is_active)
+    return is_active
+
+
 async def get_current_user(
         token: str = Depends(oauth2_scheme),
         db: AsyncSession = Depends(get_async_db)
-):
+) -> Principal:
     """
-    Проверяет JWT и возвращает пользователя из базы.
+    Проверяет JWT и возвращает пользователя по его данным (id, email, role).
+    В базу обращается только за статусом активности, и тот берётся из кэша.
+    Для токенов, выпущенных без id, пользователь ищется в базе по email.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -85,15 +128,40 @@ async def get_current_user(
     except jwt.PyJWTError:
         raise credentials_exception
 
-    user_db = await db.scalars(select(UserModel).where(
+    user_id = payload.get("id")
+    role = payload.get("role")
+    if isinstance(user_id, int) and isinstance(role, str):
+        if not await _is_user_active(db, user_id):
+            raise credentials_exception
+        return Principal(id=user_id, email=email, role=role)
+
+    result = await db.execute(select(UserModel.id, UserModel.role).where(
         UserModel.email == email, UserModel.is_active == True)
     )
-    user = user_db.first()
+    user = result.first()
     if user is None:
         raise credentials_exception
+    return Principal(id=user.id, email=email, role=user.role)
+
+
+async def get_current_user_model(
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
+) -> UserModel:
+    """
+    Загружает ORM-объект текущего пользователя — для маршрутов, которым мало данных токена.
+    """
+    user = await db.get(UserModel, current_user.id)
+    if user is None or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
-async def get_current_seller(current_user: UserModel = Depends(get_current_user)):
+
+async def get_current_seller(current_user: Principal = Depends(get_current_user)) -> Principal:
     """
     Проверяет, что пользователь имеет роль 'seller'.
     """
@@ -101,10 +169,10 @@ async def get_current_seller(current_user: UserModel = Depends(get_current_user)
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only sellers can perform this action")
     return current_user
 
-async def get_current_admin(current_user: UserModel = Depends(get_current_user)):
+async def get_current_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
     """
-    Проверяет, что пользователь имеет роль 'seller'.
+    Проверяет, что пользователь имеет роль 'admin'.
     """
     if current_user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only admins can perform this action")
-    return current_user
\ No newline at end of file
+    return current_user
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask(ABC):
+    """
+    Фоновая задача процесса, выполняющая run_once() раз в interval секунд.
+    Ошибка прохода логируется, следующий проход выполняется по расписанию.
+    Подклассы, которым при остановке нужно дописать накопленное, дополняют stop().
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("%s pass failed", type(self).__name__)
+
+    @abstractmethod
+    async def run_once(self) -> None:
+        """Один проход фоновой задачи."""
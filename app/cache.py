@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any
+
+
+# Все именованные кэши процесса — для отдачи статистики
+CACHES: dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """
+    Ограниченный по размеру LRU-кэш в памяти процесса.
+    Записи живут не дольше ttl секунд, при переполнении вытесняются давно не читанные.
+    Чтобы не положить в кэш значение, прочитанное до параллельного сброса ключа,
+    читающий берёт token() до чтения из источника и передаёт его в set().
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # Номер последнего сброса по недавно сброшенным ключам; для забытых ключей —
+        # не больше _invalidated_floor
+        self._invalidations = 0
+        self._invalidated: OrderedDict[Hashable, int] = OrderedDict()
+        self._invalidated_floor = 0
+        if name is not None:
+            CACHES[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def token(self) -> int:
+        """
+        Отметка начала чтения значения из источника для set(token=...).
+        """
+        return self._invalidations
+
+    def set(self, key: Hashable, value: Any, token: int | None = None) -> None:
+        """
+        Кладёт значение в кэш. С token значение не кладётся, если ключ сбросили
+        после получения token: оно могло быть прочитано до изменения.
+        """
+        if token is not None and self._invalidated.get(key, self._invalidated_floor) > token:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+        self._invalidations += 1
+        self._invalidated[key] = self._invalidations
+        self._invalidated.move_to_end(key)
+        while len(self._invalidated) > self.maxsize:
+            _, self._invalidated_floor = self._invalidated.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._invalidations += 1
+        self._invalidated.clear()
+        self._invalidated_floor = self._invalidations
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Готовые JSON-ответы GET /products/{product_id}: ID товара -> (JSON, updated_at).
+# Сбрасывается маршрутами товаров и фоновыми задачами, которые меняют товары.
+product_cache = TTLCache(maxsize=2048, ttl=300, name="product_detail")
+
+# Активные товары для записи в корзину: ID товара -> схема Product.
+# Сбрасывается при изменении и снятии товара с продажи; цена и остаток в ответах
+# на изменение корзины могут отставать не больше чем на ttl секунд.
+cart_product_cache = TTLCache(maxsize=4096, ttl=30, name="cart_products")
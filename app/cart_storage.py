@@ -0,0 +1,495 @@
+import asyncio
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from decimal import Decimal
+
+from sqlalchemy import Integer, any_, delete, func, literal, select, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.background import PeriodicTask
+from app.cache import cart_product_cache
+from app.config import CART_STORAGE
+from app.database import async_session_maker
+from app.models.cart_items import CartItem as CartItemModel
+from app.models.products import Product as ProductModel
+from app.schemas import Product as ProductSchema
+
+
+async def get_active_products(db: AsyncSession, product_ids: list[int]) -> dict[int, ProductSchema]:
+    """
+    Активные товары по ID: из cart_product_cache, недостающие — одним запросом.
+    Отсутствующие в ответе товары не найдены или сняты с продажи.
+    """
+    products = {}
+    to_fetch = []
+    for product_id in product_ids:
+        product = cart_product_cache.get(product_id)
+        if product is None:
+            to_fetch.append(product_id)
+        else:
+            products[product_id] = product
+
+    if to_fetch:
+        token = cart_product_cache.token()
+        result = await db.scalars(
+            select(ProductModel).where(
+                ProductModel.id == any_(literal(to_fetch, ARRAY(Integer))),
+                ProductModel.is_active == True,
+            )
+        )
+        for model in result.all():
+            product = products[model.id] = ProductSchema.model_validate(model)
+            cart_product_cache.set(model.id, product, token=token)
+    return products
+
+
+class CartStorage(ABC):
+    """
+    Хранилище корзин пользователей.
+    Позиция корзины — объект или словарь с полями id, quantity и product (ORM-объект товара).
+    Методы записи сами завершают свою работу с базой, вызывающей стороне коммитить не нужно.
+    Когда изменение становится постоянным, зависит от бэкенда: PostgresCartStorage
+    коммитит его сразу, MemoryCartStorage — при очередной отложенной записи.
+    """
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def get_items(self, db: AsyncSession, user_id: int) -> list:
+        """Позиции корзины в порядке добавления."""
+
+    @abstractmethod
+    async def get_totals(self, db: AsyncSession, user_id: int) -> tuple[int, Decimal]:
+        """Общее количество и общая стоимость товаров в корзине."""
+
+    @abstractmethod
+    async def add_item(self, db: AsyncSession, user_id: int, product_id: int, quantity: int):
+        """Добавляет товар или увеличивает его количество. None — товар не найден или неактивен."""
+
+    @abstractmethod
+    async def set_item(self, db: AsyncSession, user_id: int, product_id: int, quantity: int):
+        """Задаёт количество товара, уже лежащего в корзине. None — позиции нет или товар неактивен."""
+
+    @abstractmethod
+    async def remove_item(self, db: AsyncSession, user_id: int, product_id: int) -> bool:
+        """Удаляет позицию корзины. False — позиции не было."""
+
+    @abstractmethod
+    async def clear(self, db: AsyncSession, user_id: int) -> None:
+        """Удаляет все позиции корзины."""
+
+    @abstractmethod
+    async def apply(
+            self,
+            db: AsyncSession,
+            user_id: int,
+            sets: dict[int, int],
+            increments: dict[int, int],
+            removes: list[int],
+    ) -> None:
+        """
+        Применяет пакет изменений по разным товарам. Наличие товаров проверяет вызывающая сторона.
+        """
+
+    @abstractmethod
+    def sql_access(self, user_id: int) -> AbstractAsyncContextManager[None]:
+        """
+        Внутри блока с cart_items пользователя можно работать напрямую в SQL:
+        корзина к его началу уже записана в таблицу, а изменения через хранилище
+        ждут выхода из блока. Транзакцию нужно завершить внутри блока.
+        """
+
+    def stats(self) -> dict:
+        return {"backend": CART_STORAGE}
+
+
+class PostgresCartStorage(CartStorage):
+    """
+    Корзины хранятся только в cart_items, каждая запись — отдельная транзакция.
+    """
+
+    @asynccontextmanager
+    async def sql_access(self, user_id: int) -> AsyncIterator[None]:
+        # Копий корзин вне cart_items нет — согласовывать нечего
+        yield
+
+    async def _write_item(self, db: AsyncSession, write_stmt) -> dict | None:
+        """
+        Выполняет INSERT/UPDATE позиции корзины и в том же запросе возвращает её вместе с товаром.
+        """
+        changed = write_stmt.returning(
+            CartItemModel.id, CartItemModel.quantity, CartItemModel.product_id
+        ).cte("changed_cart_item")
+        result = await db.execute(
+            select(changed.c.id, changed.c.quantity, ProductModel)
+            .join(ProductModel, ProductModel.id == changed.c.product_id)
+        )
+        row = result.first()
+        if row is None:
+            return None
+        await db.commit()
+        return {"id": row.id, "quantity": row.quantity, "product": row[2]}
+
+    async def get_items(self, db: AsyncSession, user_id: int) -> list:
+        result = await db.scalars(
+            select(CartItemModel)
+            .options(selectinload(CartItemModel.product))
+            .where(CartItemModel.user_id == user_id)
+            .order_by(CartItemModel.id)
+        )
+        return list(result.all())
+
+    async def get_totals(self, db: AsyncSession, user_id: int) -> tuple[int, Decimal]:
+        result = await db.execute(
+            select(
+                func.coalesce(func.sum(CartItemModel.quantity), 0),
+                func.coalesce(func.sum(CartItemModel.quantity * ProductModel.price), 0),
+            )
+            .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+            .where(CartItemModel.user_id == user_id)
+        )
+        total_quantity, total_price = result.one()
+        return total_quantity, total_price
+
+    async def add_item(self, db: AsyncSession, user_id: int, product_id: int, quantity: int):
+        # Проверка товара, вставка или увеличение количества и чтение товара — одним запросом
+        insert_stmt = pg_insert(CartItemModel).from_select(
+            ["user_id", "product_id", "quantity"],
+            select(literal(user_id), ProductModel.id, literal(quantity)).where(
+                ProductModel.id == product_id,
+                ProductModel.is_active == True,
+            ),
+        )
+        upsert_stmt = insert_stmt.on_conflict_do_update(
+            index_elements=[CartItemModel.user_id, CartItemModel.product_id],
+            set_={
+                "quantity": CartItemModel.quantity + insert_stmt.excluded.quantity,
+                "updated_at": func.now(),
+            },
+        )
+        return await self._write_item(db, upsert_stmt)
+
+    async def set_item(self, db: AsyncSession, user_id: int, product_id: int, quantity: int):
+        # Обновление позиции активного товара и чтение товара — одним запросом
+        update_stmt = (
+            update(CartItemModel)
+            .where(
+                CartItemModel.user_id == user_id,
+                CartItemModel.product_id == product_id,
+                ProductModel.id == CartItemModel.product_id,
+                ProductModel.is_active == True,
+            )
+            .values(quantity=quantity)
+        )
+        return await self._write_item(db, update_stmt)
+
+    async def remove_item(self, db: AsyncSession, user_id: int, product_id: int) -> bool:
+        result = await db.execute(
+            delete(CartItemModel).where(
+                CartItemModel.user_id == user_id,
+                CartItemModel.product_id == product_id,
+            )
+        )
+        await db.commit()
+        return result.rowcount > 0
+
+    async def clear(self, db: AsyncSession, user_id: int) -> None:
+        await db.execute(delete(CartItemModel).where(CartItemModel.user_id == user_id))
+        await db.commit()
+
+    async def apply(
+            self,
+            db: AsyncSession,
+            user_id: int,
+            sets: dict[int, int],
+            increments: dict[int, int],
+            removes: list[int],
+    ) -> None:
+        for quantities, increment in ((sets, False), (increments, True)):
+            if not quantities:
+                continue
+            insert_stmt = pg_insert(CartItemModel).values([
+                {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+                for product_id, quantity in quantities.items()
+            ])
+            quantity = insert_stmt.excluded.quantity
+            await db.execute(insert_stmt.on_conflict_do_update(
+                index_elements=[CartItemModel.user_id, CartItemModel.product_id],
+                set_={
+                    "quantity": CartItemModel.quantity + quantity if increment else quantity,
+                    "updated_at": func.now(),
+                },
+            ))
+        if removes:
+            await db.execute(
+                delete(CartItemModel).where(
+                    CartItemModel.user_id == user_id,
+                    CartItemModel.product_id == any_(literal(removes, ARRAY(Integer))),
+                )
+            )
+        await db.commit()
+
+
+class MemoryCartStorage(PeriodicTask, CartStorage):
+    """
+    Горячие корзины в памяти процесса с отложенной записью в cart_items.
+    Корзина читается из базы при первом обращении, дальше изменения применяются
+    только в памяти и раз в flush_interval секунд пишутся пачками: лишние строки
+    пользователей удаляются одним DELETE, остальные — одним INSERT ... ON CONFLICT.
+    При остановке приложения всё несохранённое дописывается в базу; при аварийном
+    завершении теряются изменения не более чем за flush_interval секунд.
+    Корзины живут в памяти одного процесса, поэтому бэкенд рассчитан на один
+    процесс приложения или на привязку пользователя к процессу.
+    """
+
+    def __init__(self, flush_interval: float = 1.0, max_batch_rows: int = 2000, max_carts: int = 100_000):
+        super().__init__(flush_interval)
+        self.max_batch_rows = max_batch_rows
+        self.max_carts = max_carts
+        # user_id -> {product_id: quantity} в порядке добавления; давно не использованные — в начале
+        self._carts: OrderedDict[int, dict[int, int]] = OrderedDict()
+        # user_id -> номер последнего несохранённого изменения
+        self._dirty: dict[int, int] = {}
+        self._version = 0
+        self._flush_lock = asyncio.Lock()
+        # user_id -> блокировка корзины; запись исчезает, когда блокировку никто не держит и не ждёт
+        self._user_locks: weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+        self.flushed_carts = 0
+        self.flushed_batches = 0
+        self.failed_flushes = 0
+        self.last_flush_seconds = 0.0
+
+    async def stop(self) -> None:
+        """
+        Останавливает фоновую запись и дописывает все несохранённые корзины.
+        """
+        await super().stop()
+        await self.flush()
+
+    async def run_once(self) -> None:
+        await self.flush()
+
+    def _user_lock(self, user_id: int) -> asyncio.Lock:
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = self._user_locks[user_id] = asyncio.Lock()
+        return lock
+
+    async def _cart(self, db: AsyncSession, user_id: int) -> dict[int, int]:
+        """
+        Корзина пользователя в памяти. Вызывается под блокировкой пользователя.
+        """
+        cart = self._carts.get(user_id)
+        if cart is None:
+            result = await db.execute(
+                select(CartItemModel.product_id, CartItemModel.quantity)
+                .where(CartItemModel.user_id == user_id)
+                .order_by(CartItemModel.id)
+            )
+            cart = self._carts[user_id] = {product_id: quantity for product_id, quantity in result}
+            self._evict()
+        self._carts.move_to_end(user_id)
+        return cart
+
+    def _evict(self) -> None:
+        # Вытесняются только сохранённые корзины, начиная с давно не использованных
+        for user_id in list(self._carts):
+            if len(self._carts) <= self.max_carts:
+                return
+            if user_id not in self._dirty:
+                del self._carts[user_id]
+
+    def _touch(self, user_id: int) -> None:
+        self._version += 1
+        self._dirty[user_id] = self._version
+
+    async def get_items(self, db: AsyncSession, user_id: int) -> list:
+        async with self._user_lock(user_id):
+            cart = dict(await self._cart(db, user_id))
+        if not cart:
+            return []
+        result = await db.scalars(
+            select(ProductModel).where(ProductModel.id == any_(literal(list(cart), ARRAY(Integer))))
+        )
+        products = {product.id: product for product in result.all()}
+        return [
+            {"id": None, "quantity": quantity, "product": products[product_id]}
+            for product_id, quantity in cart.items()
+            if product_id in products
+        ]
+
+    async def get_totals(self, db: AsyncSession, user_id: int) -> tuple[int, Decimal]:
+        async with self._user_lock(user_id):
+            cart = dict(await self._cart(db, user_id))
+        if not cart:
+            return 0, Decimal("0")
+        result = await db.execute(
+            select(ProductModel.id, ProductModel.price)
+            .where(ProductModel.id == any_(literal(list(cart), ARRAY(Integer))))
+        )
+        prices = dict(result.all())
+        quantities = {product_id: quantity for product_id, quantity in cart.items() if product_id in prices}
+        total_price = sum((prices[product_id] * quantity for product_id, quantity in quantities.items()), Decimal("0"))
+        return sum(quantities.values()), total_price
+
+    async def add_item(self, db: AsyncSession, user_id: int, product_id: int, quantity: int):
+        # Наличие товара проверяется по кэшу: горячая запись в корзину не ходит в базу
+        product = (await get_active_products(db, [product_id])).get(product_id)
+        if product is None:
+            return None
+        async with self._user_lock(user_id):
+            cart = await self._cart(db, user_id)
+            cart[product_id] = cart.get(product_id, 0) + quantity
+            self._touch(user_id)
+            return {"id": None, "quantity": cart[product_id], "product": product}
+
+    async def set_item(self, db: AsyncSession, user_id: int, product_id: int, quantity: int):
+        product = (await get_active_products(db, [product_id])).get(product_id)
+        if product is None:
+            return None
+        async with self._user_lock(user_id):
+            cart = await self._cart(db, user_id)
+            if product_id not in cart:
+                return None
+            cart[product_id] = quantity
+            self._touch(user_id)
+        return {"id": None, "quantity": quantity, "product": product}
+
+    async def remove_item(self, db: AsyncSession, user_id: int, product_id: int) -> bool:
+        async with self._user_lock(user_id):
+            cart = await self._cart(db, user_id)
+            if product_id not in cart:
+                return False
+            del cart[product_id]
+            self._touch(user_id)
+        return True
+
+    async def clear(self, db: AsyncSession, user_id: int) -> None:
+        # Загружать корзину не нужно: при записи удалятся все строки пользователя
+        async with self._user_lock(user_id):
+            self._carts.setdefault(user_id, {}).clear()
+            self._carts.move_to_end(user_id)
+            self._touch(user_id)
+            self._evict()
+
+    async def apply(
+            self,
+            db: AsyncSession,
+            user_id: int,
+            sets: dict[int, int],
+            increments: dict[int, int],
+            removes: list[int],
+    ) -> None:
+        async with self._user_lock(user_id):
+            cart = await self._cart(db, user_id)
+            cart.update(sets)
+            for product_id, quantity in increments.items():
+                cart[product_id] = cart.get(product_id, 0) + quantity
+            for product_id in removes:
+                cart.pop(product_id, None)
+            self._touch(user_id)
+
+    async def flush(self) -> None:
+        """
+        Дописывает корзины, изменённые к началу вызова, пачками до max_batch_rows позиций.
+        Корзина, изменённая во время записи, остаётся несохранённой до следующего раза.
+        """
+        async with self._flush_lock:
+            batch: dict[int, tuple[dict[int, int], int]] = {}
+            rows = 0
+            for user_id in sorted(self._dirty):
+                if user_id not in self._dirty:
+                    continue
+                cart = dict(self._carts[user_id])
+                batch[user_id] = (cart, self._dirty[user_id])
+                rows += len(cart) + 1
+                if rows >= self.max_batch_rows:
+                    await self._write_batch(batch)
+                    batch, rows = {}, 0
+            if batch:
+                await self._write_batch(batch)
+
+    @asynccontextmanager
+    async def sql_access(self, user_id: int) -> AsyncIterator[None]:
+        """
+        Дописывает корзину пользователя и держит её блокировку до конца блока:
+        параллельные изменения корзины ждут, а фоновая запись не вернёт в cart_items
+        строки, удалённые в блоке. После блока копия в памяти сбрасывается
+        и при следующем обращении читается из базы заново.
+        """
+        async with self._user_lock(user_id):
+            async with self._flush_lock:
+                if user_id in self._dirty:
+                    await self._write_batch({user_id: (dict(self._carts[user_id]), self._dirty[user_id])})
+            try:
+                yield
+            finally:
+                self._carts.pop(user_id, None)
+                self._dirty.pop(user_id, None)
+
+    async def _write_batch(self, batch: dict[int, tuple[dict[int, int], int]]) -> None:
+        started = time.monotonic()
+        user_ids = list(batch)
+        kept = [(user_id, product_id) for user_id, (cart, _) in batch.items() for product_id in cart]
+        stale = delete(CartItemModel).where(CartItemModel.user_id == any_(literal(user_ids, ARRAY(Integer))))
+        if kept:
+            stale = stale.where(tuple_(CartItemModel.user_id, CartItemModel.product_id).not_in(kept))
+
+        try:
+            async with async_session_maker() as session:
+                await session.execute(stale)
+                if kept:
+                    insert_stmt = pg_insert(CartItemModel).values([
+                        {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+                        for user_id, (cart, _) in batch.items()
+                        for product_id, quantity in cart.items()
+                    ])
+                    await session.execute(insert_stmt.on_conflict_do_update(
+                        index_elements=[CartItemModel.user_id, CartItemModel.product_id],
+                        set_={"quantity": insert_stmt.excluded.quantity, "updated_at": func.now()},
+                        where=CartItemModel.quantity != insert_stmt.excluded.quantity,
+                    ))
+                await session.commit()
+        except Exception:
+            self.failed_flushes += 1
+            raise
+
+        for user_id, (_, version) in batch.items():
+            if self._dirty.get(user_id) == version:
+                del self._dirty[user_id]
+        self.flushed_carts += len(batch)
+        self.flushed_batches += 1
+        self.last_flush_seconds = time.monotonic() - started
+
+    def stats(self) -> dict:
+        return {
+            "backend": CART_STORAGE,
+            "carts": len(self._carts),
+            "dirty": len(self._dirty),
+            "flushed_carts": self.flushed_carts,
+            "flushed_batches": self.flushed_batches,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_seconds": round(self.last_flush_seconds, 3),
+        }
+
+
+def create_cart_storage(backend: str) -> CartStorage:
+    if backend == "postgres":
+        return PostgresCartStorage()
+    if backend == "memory":
+        return MemoryCartStorage()
+    raise ValueError(f"Unknown cart storage backend: {backend!r}")
+
+
+# Бэкенд выбирается переменной окружения CART_STORAGE: postgres (по умолчанию) или memory
+cart_storage = create_cart_storage(CART_STORAGE)
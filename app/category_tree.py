@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+
+from pydantic import TypeAdapter
+from sqlalchemy import delete, exists, insert, literal, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.database import async_session_maker
+from app.models.categories import Category as CategoryModel
+from app.models.category_closure import CategoryClosure
+from app.schemas import CategoryTreeNode
+
+
+CLOSURE_COLUMNS = ["ancestor_id", "descendant_id", "depth"]
+
+
+def category_subtree_ids(category_id: int):
+    """
+    SELECT с ID категории и всех её потомков по таблице замыкания.
+    Потомок не попадает в выборку, если он сам или кто-то на пути к нему неактивен.
+    """
+    path = aliased(CategoryClosure)
+    inactive_on_path = exists().where(
+        path.descendant_id == CategoryClosure.descendant_id,
+        path.depth <= CategoryClosure.depth,
+        CategoryModel.id == path.ancestor_id,
+        CategoryModel.is_active == False,
+    )
+    return select(CategoryClosure.descendant_id).where(
+        CategoryClosure.ancestor_id == category_id,
+        ~inactive_on_path,
+    )
+
+
+def category_ancestors(category_id: int):
+    """
+    SELECT цепочки категорий от корня до указанной категории включительно (хлебные крошки).
+    """
+    return (
+        select(CategoryModel)
+        .join(CategoryClosure, CategoryClosure.ancestor_id == CategoryModel.id)
+        .where(CategoryClosure.descendant_id == category_id)
+        .order_by(CategoryClosure.depth.desc())
+    )
+
+
+async def is_in_subtree(db: AsyncSession, root_id: int, category_id: int) -> bool:
+    """
+    Проверяет, входит ли category_id в поддерево root_id (включая сам root_id).
+    """
+    return bool(await db.scalar(
+        select(exists().where(
+            CategoryClosure.ancestor_id == root_id,
+            CategoryClosure.descendant_id == category_id,
+        ))
+    ))
+
+
+async def add_category_to_closure(db: AsyncSession, category_id: int, parent_id: int | None) -> None:
+    """
+    Добавляет в замыкание новую категорию: связь с собой и со всеми предками родителя.
+    Вызывается в транзакции, создающей категорию.
+    """
+    await db.execute(
+        insert(CategoryClosure).values(ancestor_id=category_id, descendant_id=category_id, depth=0)
+    )
+    if parent_id is not None:
+        await db.execute(
+            insert(CategoryClosure).from_select(
+                CLOSURE_COLUMNS,
+                select(
+                    CategoryClosure.ancestor_id,
+                    literal(category_id),
+                    CategoryClosure.depth + 1,
+                ).where(CategoryClosure.descendant_id == parent_id),
+            )
+        )
+
+
+async def move_category_in_closure(db: AsyncSession, category_id: int, new_parent_id: int | None) -> None:
+    """
+    Переносит поддерево категории под нового родителя.
+    Вызывается в транзакции, обновляющей parent_id. Проверка на цикл — на вызывающей стороне.
+    """
+    subtree_link = aliased(CategoryClosure)
+    ancestor_link = aliased(CategoryClosure)
+    subtree = select(subtree_link.descendant_id).where(subtree_link.ancestor_id == category_id)
+    old_ancestors = select(ancestor_link.ancestor_id).where(
+        ancestor_link.descendant_id == category_id, ancestor_link.depth > 0
+    )
+    # Отрезаем поддерево от прежних предков
+    await db.execute(
+        delete(CategoryClosure).where(
+            CategoryClosure.descendant_id.in_(subtree),
+            CategoryClosure.ancestor_id.in_(old_ancestors),
+        )
+    )
+    if new_parent_id is None:
+        return
+
+    # Каждый предок нового родителя становится предком каждого узла поддерева
+    supertree = aliased(CategoryClosure)
+    sub = aliased(CategoryClosure)
+    await db.execute(
+        insert(CategoryClosure).from_select(
+            CLOSURE_COLUMNS,
+            select(
+                supertree.ancestor_id,
+                sub.descendant_id,
+                supertree.depth + sub.depth + 1,
+            )
+            .join(sub, true())
+            .where(supertree.descendant_id == new_parent_id, sub.ancestor_id == category_id),
+        )
+    )
+
+
+async def rebuild_category_closure(db: AsyncSession) -> None:
+    """
+    Полностью пересобирает таблицу замыкания по parent_id одним рекурсивным запросом.
+    """
+    tree = select(
+        CategoryModel.id.label("ancestor_id"),
+        CategoryModel.id.label("descendant_id"),
+        literal(0).label("depth"),
+    ).cte("closure", recursive=True)
+    tree = tree.union_all(
+        select(tree.c.ancestor_id, CategoryModel.id, tree.c.depth + 1)
+        .where(CategoryModel.parent_id == tree.c.descendant_id)
+    )
+    await db.execute(delete(CategoryClosure))
+    await db.execute(
+        insert(CategoryClosure).from_select(
+            CLOSURE_COLUMNS,
+            select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth),
+        )
+    )
+
+
+class CategoryTreeCache:
+    """
+    Готовое дерево активных категорий в JSON и его ETag.
+    Любая запись в категории увеличивает version, и дерево пересобирается при следующем чтении.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._built_version = -1
+        self._payload: bytes | None = None
+        self._etag: str | None = None
+
+    def bump(self) -> None:
+        self.version += 1
+
+    def get(self) -> tuple[bytes, str] | None:
+        if self._built_version != self.version:
+            return None
+        return self._payload, self._etag
+
+    def set(self, version: int, payload: bytes) -> tuple[bytes, str]:
+        # version берётся до чтения из базы: запись во время сборки оставит кэш устаревшим
+        etag = f'"{hashlib.sha256(payload).hexdigest()[:32]}"'
+        self._payload, self._etag, self._built_version = payload, etag, version
+        return payload, etag
+
+
+category_tree_cache = CategoryTreeCache()
+_category_tree_adapter = TypeAdapter(list[CategoryTreeNode])
+
+
+def build_category_tree(categories: list[CategoryModel]) -> bytes:
+    """
+    Собирает вложенное дерево из плоского списка активных категорий и сериализует его.
+    Категории под неактивным родителем в дерево не попадают.
+    """
+    nodes = {
+        category.id: {"id": category.id, "name": category.name, "parent_id": category.parent_id, "children": []}
+        for category in categories
+    }
+    roots = []
+    for node in nodes.values():
+        if node["parent_id"] is None:
+            roots.append(node)
+        elif node["parent_id"] in nodes:
+            nodes[node["parent_id"]]["children"].append(node)
+    return _category_tree_adapter.dump_json(roots)
+
+
+async def _rebuild() -> None:
+    async with async_session_maker() as session:
+        await rebuild_category_closure(session)
+        await session.commit()
+
+
+if __name__ == "__main__":
+    # Пересборка таблицы замыкания: python -m app.category_tree
+    asyncio.run(_rebuild())
@@ -0,0 +1,90 @@
+import hashlib
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request
+from sqlalchemy import Sequence, column, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import TTLCache
+
+
+# Последние прочитанные версии коллекций: ими подписываются безусловные ответы списков
+collection_version_cache = TTLCache(maxsize=16, ttl=1, name="collection_versions")
+
+
+def make_etag(*parts) -> str:
+    """
+    Строит сильный ETag из частей, однозначно определяющих представление ресурса.
+    """
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Проверяет заголовок If-None-Match запроса на совпадение с ETag ответа.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def is_conditional(request: Request) -> bool:
+    """
+    Есть ли в запросе заголовки условного GET.
+    """
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def not_modified(request: Request, etag: str, last_modified: datetime | None) -> bool:
+    """
+    Можно ли ответить 304: If-None-Match приоритетнее If-Modified-Since (RFC 9110).
+    """
+    if "if-none-match" in request.headers:
+        return etag_matches(request, etag)
+    header = request.headers.get("if-modified-since")
+    if not header or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None or last_modified.tzinfo is None:
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
+
+def validator_headers(etag: str, last_modified: datetime | None) -> dict[str, str]:
+    """
+    Заголовки ETag, Last-Modified и Cache-Control для ответа, который клиент будет перепроверять.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+async def collection_version(db: AsyncSession, request: Request, sequence: Sequence) -> int:
+    """
+    Версия коллекции для ETag списка — чтение одной строки последовательности.
+    Условный запрос читает её из базы; безусловный берёт значение, прочитанное
+    не дольше секунды назад: устаревшая версия даст лишний 200, но не ложный 304,
+    потому что она всегда прочитана раньше данных ответа.
+    """
+    version = None if is_conditional(request) else collection_version_cache.get(sequence.name)
+    if version is None:
+        version = await db.scalar(select(column("last_value")).select_from(table(sequence.name)))
+        collection_version_cache.set(sequence.name, version)
+    return version
+
+
+async def bump_collection_versions(db: AsyncSession, *sequences: Sequence) -> None:
+    """
+    Увеличивает версии коллекций. Вызывается после commit записи: nextval вне
+    транзакции, и увеличенная до фиксации версия досталась бы ответам со старыми
+    данными. Так даже изменения длинной транзакции меняют ETag в момент фиксации.
+    """
+    await db.execute(select(*(sequence.next_value() for sequence in sequences)))
@@ -5,4 +5,6 @@ from dotenv import load_dotenv
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
-PASSWORD = os.getenv("PASSWORD")
\ No newline at end of file
+PASSWORD = os.getenv("PASSWORD")
+# Хранилище корзин: postgres — сразу в cart_items, memory — в памяти с отложенной записью
+CART_STORAGE = os.getenv("CART_STORAGE", "postgres")
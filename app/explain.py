@@ -0,0 +1,33 @@
+import json
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
+
+
+class Explain(Executable, ClauseElement):
+    """
+    Конструкция EXPLAIN (FORMAT JSON) поверх произвольного SELECT.
+    Параметры запроса передаются драйверу как обычно, без подстановки литералов.
+    """
+    inherit_cache = False
+
+    def __init__(self, statement, analyze: bool = False):
+        self.statement = statement
+        self.analyze = analyze
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    options = "ANALYZE, FORMAT JSON" if element.analyze else "FORMAT JSON"
+    return f"EXPLAIN ({options}) " + compiler.process(element.statement, **kw)
+
+
+async def explain_plan(db: AsyncSession, statement, analyze: bool = False) -> dict:
+    """
+    Возвращает корневой узел плана запроса ("Plan") в виде словаря.
+    """
+    raw = await db.scalar(Explain(statement, analyze=analyze))
+    plan = json.loads(raw) if isinstance(raw, str) else raw
+    return plan[0]["Plan"]
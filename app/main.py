@@ -1,21 +1,46 @@
+from contextlib import AsyncExitStack, asynccontextmanager
+
 from fastapi import FastAPI
 
-from app.routers import cart, categories, products, reviews,users
+from app.cache import CACHES
+from app.cart_storage import cart_storage
+from app.password_hashing import password_hashing_pool
+from app.rating_queue import rating_queue
+from app.reservation_sweeper import reservation_sweeper
+from app.routers import cart, categories, orders, product_io, products, reviews,users
+
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Запускает фоновые задачи приложения и дописывает их очереди при остановке.
+    Остановка идёт в обратном порядке через AsyncExitStack: ошибка одной задачи
+    не отменяет остановку остальных (в том числе запись корзин из памяти).
+    """
+    async with AsyncExitStack() as stack:
+        stack.push_async_callback(password_hashing_pool.shutdown)
+        for task in (rating_queue, reservation_sweeper, cart_storage):
+            await task.start()
+            stack.push_async_callback(task.stop)
+        yield
 
 
 # Создаём приложение FastAPI
 app = FastAPI(
     title="FastAPI Интернет-магазин",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Подключаем маршруты категорий
 app.include_router(categories.router)
+app.include_router(product_io.router)
 app.include_router(products.router)
 app.include_router(users.router)
 app.include_router(reviews.router)
 app.include_router(cart.router)
+app.include_router(orders.router)
 
 # Корневой эндпоинт для проверки
 @app.get("/")
@@ -23,4 +48,36 @@ async def root():
     """
     Корневой маршрут, подтверждающий, что API работает.
     """
-    return {"message": "Добро пожаловать в API интернет-магазина!"}
\ No newline at end of file
+    return {"message": "Добро пожаловать в API интернет-магазина!"}
+
+
+@app.get("/metrics/caches")
+async def get_cache_stats():
+    """
+    Статистика кэшей процесса: размер, попадания, промахи, вытеснения.
+    """
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+
+@app.get("/metrics/rating-queue")
+async def get_rating_queue_stats():
+    """
+    Состояние очереди пересчёта рейтингов: глубина, задержка, количество записей.
+    """
+    return rating_queue.stats()
+
+
+@app.get("/metrics/cart-storage")
+async def get_cart_storage_stats():
+    """
+    Состояние хранилища корзин: бэкенд, корзины в памяти, несохранённые корзины, записи в базу.
+    """
+    return cart_storage.stats()
+
+
+@app.get("/metrics/password-hashing")
+async def get_password_hashing_stats():
+    """
+    Загрузка пула хеширования паролей: занятые потоки, очередь, отказы, время хеширования.
+    """
+    return password_hashing_pool.stats()
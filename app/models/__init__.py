@@ -1,8 +1,11 @@
 from .cart_items import CartItem
 from .categories import Category
+from .category_closure import CategoryClosure
+from .orders import Order, OrderItem
 from .products import Product
+from .rating_histograms import ProductRatingHistogram
 from .reviews import Review
 from .users import User
 
 
-__all__ = ["Category", "CartItem", "Product", "User"]
\ No newline at end of file
+__all__ = ["Category", "CategoryClosure", "CartItem", "Order", "OrderItem", "Product", "ProductRatingHistogram", "User"]
\ No newline at end of file
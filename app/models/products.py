@@ -1,5 +1,6 @@
+from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import String, Boolean, Integer, Numeric, text, Computed, Index
+from sqlalchemy import String, Boolean, Integer, Numeric, text, Computed, Index, DDL, event, func, DateTime, Sequence
 from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship  # New
 from sqlalchemy import ForeignKey  # New
@@ -18,8 +19,17 @@ class Product(Base):
     stock: Mapped[int] = mapped_column(Integer, nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     rating: Mapped[float] = mapped_column(default=0.0, server_default=text('0'))
+    # Сумма и количество оценок активных отзывов: рейтинг обновляется за O(1)
+    rating_sum: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text('0'))
+    rating_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text('0'))
     category_id: Mapped[int] = mapped_column(ForeignKey("categories.id"), nullable=False)
     seller_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    # clock_timestamp(), а не now(): время записи строки, а не начала транзакции —
+    # иначе строки длинной транзакции оказываются «старше» уже видимых изменений
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.clock_timestamp(), onupdate=func.clock_timestamp(),
+        nullable=False, index=True,
+    )
 
     tsv: Mapped[TSVECTOR] = mapped_column(
         TSVECTOR,
@@ -32,6 +42,9 @@ class Product(Base):
             persisted=True,
         ),
         nullable=False,
+        # Нужен только для поиска в SQL: не загружаем в объекты и не даём подгрузить неявно
+        deferred=True,
+        deferred_raiseload=True,
     )
 
     category: Mapped["Category"] = relationship("Category", back_populates="products")
@@ -44,3 +57,17 @@ class Product(Base):
     __table_args__ = (
         Index("ix_products_tsv_gin", "tsv", postgresql_using="gin"),
     )
+
+
+# Триграммный индекс для поиска подстроки в названии: lower(name) LIKE '%...%'
+Index(
+    "ix_products_name_trgm",
+    func.lower(Product.name).label("name_lower"),
+    postgresql_using="gin",
+    postgresql_ops={"name_lower": "gin_trgm_ops"},
+)
+
+event.listen(Product.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+# Версия коллекции товаров для ETag списков: увеличивается после фиксации каждой записи
+PRODUCTS_VERSION = Sequence("products_version_seq", metadata=Base.metadata)
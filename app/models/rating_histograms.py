@@ -0,0 +1,24 @@
+from sqlalchemy import ForeignKey, Integer, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class ProductRatingHistogram(Base):
+    """
+    Количество активных отзывов товара по каждой оценке от 1 до 5.
+    """
+    __tablename__ = "product_rating_histograms"
+
+    product_id: Mapped[int] = mapped_column(
+        ForeignKey("products.id", ondelete="CASCADE"), primary_key=True
+    )
+    grade_1: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text('0'))
+    grade_2: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text('0'))
+    grade_3: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text('0'))
+    grade_4: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text('0'))
+    grade_5: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default=text('0'))
+
+
+GRADES = (1, 2, 3, 4, 5)
+GRADE_COLUMNS = tuple(f"grade_{grade}" for grade in GRADES)
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import String, Boolean, Integer, Numeric, Text
+from sqlalchemy import String, Boolean, Integer, Numeric, Text, DateTime, Index, Sequence, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship  # New
 from sqlalchemy import ForeignKey  # New
 
@@ -17,6 +17,23 @@ class Review(Base):
     comment_date: Mapped[datetime] = mapped_column(nullable=False, default=datetime.now)
     grade: Mapped[int] = mapped_column(nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # clock_timestamp(), а не now(): время записи строки, а не начала транзакции —
+    # иначе строки длинной транзакции оказываются «старше» уже видимых изменений
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.clock_timestamp(), onupdate=func.clock_timestamp(),
+        nullable=False, index=True,
+    )
 
     product: Mapped["Product"] = relationship("Product", back_populates="reviews")
-    user: Mapped["User"] = relationship("User", back_populates="reviews")
\ No newline at end of file
+    user: Mapped["User"] = relationship("User", back_populates="reviews")
+
+    __table_args__ = (
+        Index("ix_reviews_product_updated_at", "product_id", "updated_at"),
+        # Keyset-пагинация отзывов: по товару и по всем отзывам
+        Index("ix_reviews_product_active_date_id", "product_id", "is_active", "comment_date", "id"),
+        Index("ix_reviews_active_date_id", "is_active", "comment_date", "id"),
+    )
+
+
+# Версия коллекции отзывов для ETag списков: увеличивается после фиксации каждой записи
+REVIEWS_VERSION = Sequence("reviews_version_seq", metadata=Base.metadata)
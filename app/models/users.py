@@ -19,3 +19,4 @@ class User(Base):
     cart_items: Mapped[list["CartItem"]] = relationship(
         "CartItem", back_populates="user", cascade="all, delete-orphan"
     )
+    orders: Mapped[list["Order"]] = relationship("Order", back_populates="user")
@@ -0,0 +1,38 @@
+import base64
+import json
+from collections.abc import Callable
+from typing import Any
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(position: dict) -> str:
+    """
+    Упаковывает позицию последней строки страницы в непрозрачный курсор.
+    """
+    raw = json.dumps(position, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str, **fields: Callable[[Any], Any]) -> dict:
+    """
+    Распаковывает курсор, полученный от клиента, и приводит его поля: fields — имя поля и
+    функция преобразования. Курсор должен быть выдан для того же порядка выдачи kind.
+    Некорректный курсор — 400 "Invalid cursor", курсор от другой выдачи — 400 "Cursor does not match the query".
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if not isinstance(position, dict):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    try:
+        if position.get("o") != kind:
+            raise ValueError
+        return {name: convert(position[name]) for name, convert in fields.items()}
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor does not match the query",
+        )
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+from fastapi import HTTPException, status
+
+
+class PasswordHashingPool:
+    """
+    Ограниченный пул потоков для bcrypt, чтобы хеширование не блокировало цикл событий.
+    bcrypt отпускает GIL, поэтому потоки считают хеши параллельно.
+    Одновременно выполняется не больше max_workers хешей; запрос, прождавший
+    свободный поток дольше queue_timeout секунд, получает 503 с Retry-After —
+    при всплеске попыток входа лишние отбрасываются, а не копятся в очереди.
+    """
+
+    def __init__(self, max_workers: int | None = None, queue_timeout: float = 2.0, retry_after: int = 1):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hashing")
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.total_hash_seconds = 0.0
+        self.max_hash_seconds = 0.0
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Выполняет func(*args) в пуле, дождавшись свободного потока не дольше queue_timeout.
+        Поток считается занятым, пока задача не завершилась в пуле: запрос, отменённый
+        во время хеширования, не освобождает место раньше, чем освободится поток.
+        """
+        queued = time.monotonic()
+        self.waiting += 1
+        acquired = False
+        try:
+            # asyncio.timeout, а не wait_for: в 3.11 wait_for может захватить семафор
+            # и всё равно выбросить TimeoutError — такое место терялось бы навсегда
+            async with asyncio.timeout(self.queue_timeout):
+                await self._slots.acquire()
+                acquired = True
+        except TimeoutError:
+            if acquired:
+                self._slots.release()
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent password checks, retry later",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        finally:
+            self.waiting -= 1
+
+        started = time.monotonic()
+        self.total_wait_seconds += started - queued
+        self.in_flight += 1
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._release(None, started)
+            raise
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda done: loop.call_soon_threadsafe(self._release, done, started))
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future: Future | None, started: float) -> None:
+        """
+        Освобождает место в пуле, когда задача завершилась или была снята из очереди пула.
+        """
+        self.in_flight -= 1
+        self._slots.release()
+        if future is None or future.cancelled():
+            return
+        elapsed = time.monotonic() - started
+        self.completed += 1
+        self.total_hash_seconds += elapsed
+        self.max_hash_seconds = max(self.max_hash_seconds, elapsed)
+
+    async def shutdown(self) -> None:
+        """
+        Дожидается текущих хешей, не блокируя цикл событий.
+        """
+        await asyncio.to_thread(self._executor.shutdown, wait=True)
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_seconds / completed * 1000, 2),
+            "avg_hash_ms": round(self.total_hash_seconds / completed * 1000, 2),
+            "max_hash_ms": round(self.max_hash_seconds * 1000, 2),
+        }
+
+
+password_hashing_pool = PasswordHashingPool()
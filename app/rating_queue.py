@@ -0,0 +1,180 @@
+import asyncio
+import time
+
+from sqlalchemy import Integer, any_, column, literal, select, update, values
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+
+from app.background import PeriodicTask
+from app.cache import product_cache
+from app.conditional import bump_collection_versions
+from app.database import async_session_maker
+from app.models.products import PRODUCTS_VERSION, Product as ProductModel
+from app.models.rating_histograms import GRADE_COLUMNS, GRADES, ProductRatingHistogram
+from app.ratings import rating_expr
+from app.stock import locked_products
+
+
+class RatingUpdateQueue(PeriodicTask):
+    """
+    Очередь изменений рейтинга товаров в памяти процесса.
+    Изменения от отзывов копятся и схлопываются по product_id, а затем раз в
+    flush_interval секунд применяются пачками: рейтинг товаров — одним
+    UPDATE ... FROM (VALUES ...) с блокировкой строк в порядке id, гистограмма
+    оценок — таким же UPDATE. Изменение, уводящее счётчик гистограммы в минус,
+    отсекается одинаково для гистограммы и для рейтинга товара.
+    При остановке приложения очередь дописывается в базу. Изменения, потерянные
+    при аварийном завершении процесса, исправляет python -m app.ratings.
+    """
+
+    def __init__(self, flush_interval: float = 0.5, max_batch: int = 500):
+        super().__init__(flush_interval)
+        self.max_batch = max_batch
+        # product_id -> изменение количества отзывов с оценками 1..5
+        self._pending: dict[int, list[int]] = {}
+        self._oldest_enqueued_at: float | None = None
+        self._flush_lock = asyncio.Lock()
+        self.enqueued = 0
+        self.flushed_products = 0
+        self.flushed_batches = 0
+        self.failed_flushes = 0
+        self.last_flush_seconds = 0.0
+
+    def enqueue(self, product_id: int, grade: int, delta: int) -> None:
+        """
+        Ставит в очередь учёт оценки: delta=1 при создании отзыва, -1 при удалении.
+        """
+        pending = self._pending.setdefault(product_id, [0] * len(GRADES))
+        pending[grade - 1] += delta
+        if self._oldest_enqueued_at is None:
+            self._oldest_enqueued_at = time.monotonic()
+        self.enqueued += 1
+
+    async def stop(self) -> None:
+        """
+        Останавливает фоновую запись и дописывает всё, что осталось в очереди.
+        """
+        await super().stop()
+        while self._pending:
+            await self.flush()
+
+    async def run_once(self) -> None:
+        await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Применяет накопленные изменения пачками по max_batch товаров.
+        При ошибке изменения возвращаются в очередь.
+        """
+        async with self._flush_lock:
+            while self._pending:
+                started = time.monotonic()
+                batch = dict(sorted(self._pending.items())[:self.max_batch])
+                for product_id in batch:
+                    del self._pending[product_id]
+                if not self._pending:
+                    self._oldest_enqueued_at = None
+                try:
+                    await self._apply(batch)
+                except Exception:
+                    self.failed_flushes += 1
+                    self._requeue(batch)
+                    raise
+                for product_id in batch:
+                    product_cache.pop(product_id)
+                self.flushed_products += len(batch)
+                self.flushed_batches += 1
+                self.last_flush_seconds = time.monotonic() - started
+
+    def _requeue(self, batch: dict[int, list[int]]) -> None:
+        for product_id, grade_deltas in batch.items():
+            pending = self._pending.setdefault(product_id, [0] * len(GRADES))
+            for index, grade_delta in enumerate(grade_deltas):
+                pending[index] += grade_delta
+        if self._oldest_enqueued_at is None:
+            self._oldest_enqueued_at = time.monotonic()
+
+    async def _apply(self, batch: dict[int, list[int]]) -> None:
+        # Взаимно погасившиеся изменения (отзыв создан и удалён) в базу не пишем
+        batch = {product_id: deltas for product_id, deltas in batch.items() if any(deltas)}
+        if not batch:
+            return
+
+        async with async_session_maker() as session:
+            await session.execute(
+                pg_insert(ProductRatingHistogram)
+                .values([{"product_id": product_id} for product_id in sorted(batch)])
+                .on_conflict_do_nothing(index_elements=[ProductRatingHistogram.product_id])
+            )
+            result = await session.execute(
+                select(
+                    ProductRatingHistogram.product_id,
+                    *(getattr(ProductRatingHistogram, name) for name in GRADE_COLUMNS),
+                )
+                .where(ProductRatingHistogram.product_id == any_(literal(sorted(batch), ARRAY(Integer))))
+                .order_by(ProductRatingHistogram.product_id)
+                .with_for_update()
+            )
+            # Отзывы, написанные до появления гистограммы, в ней не учтены: их удаление
+            # не должно уводить счётчик в минус. Отсечённое изменение не применяется
+            # ни к гистограмме, ни к сумме и количеству оценок товара, чтобы они не расходились;
+            # точные значения по отзывам восстанавливает python -m app.ratings
+            applied = {}
+            for product_id, *counts in result:
+                grade_deltas = [
+                    max(count + delta, 0) - count for count, delta in zip(counts, batch[product_id])
+                ]
+                if any(grade_deltas):
+                    applied[product_id] = grade_deltas
+            if applied:
+                deltas = values(
+                    column("product_id", Integer),
+                    column("sum_delta", Integer),
+                    column("count_delta", Integer),
+                    *(column(name, Integer) for name in GRADE_COLUMNS),
+                    name="deltas",
+                ).data([
+                    (
+                        product_id,
+                        sum(grade * grade_delta for grade, grade_delta in zip(GRADES, grade_deltas)),
+                        sum(grade_deltas),
+                        *grade_deltas,
+                    )
+                    for product_id, grade_deltas in sorted(applied.items())
+                ])
+                new_sum = ProductModel.rating_sum + deltas.c.sum_delta
+                new_count = ProductModel.rating_count + deltas.c.count_delta
+                # Блокировки товаров — в порядке id, как при резервировании остатков в заказах
+                locked = locked_products(deltas)
+                await session.execute(
+                    update(ProductModel)
+                    .where(ProductModel.id == locked.c.id, ProductModel.id == deltas.c.product_id)
+                    .values(rating_sum=new_sum, rating_count=new_count, rating=rating_expr(new_sum, new_count))
+                )
+                await session.execute(
+                    update(ProductRatingHistogram)
+                    .where(ProductRatingHistogram.product_id == deltas.c.product_id)
+                    .values({
+                        name: getattr(ProductRatingHistogram, name) + getattr(deltas.c, name)
+                        for name in GRADE_COLUMNS
+                    })
+                )
+            await session.commit()
+            if applied:
+                await bump_collection_versions(session, PRODUCTS_VERSION)
+
+    def stats(self) -> dict:
+        lag = 0.0
+        if self._oldest_enqueued_at is not None:
+            lag = time.monotonic() - self._oldest_enqueued_at
+        return {
+            "depth": len(self._pending),
+            "lag_seconds": round(lag, 3),
+            "enqueued": self.enqueued,
+            "flushed_products": self.flushed_products,
+            "flushed_batches": self.flushed_batches,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_seconds": round(self.last_flush_seconds, 3),
+        }
+
+
+rating_queue = RatingUpdateQueue()
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+
+from sqlalchemy import Float, case, cast, exists, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.conditional import bump_collection_versions
+from app.database import async_session_maker
+from app.models.products import PRODUCTS_VERSION, Product as ProductModel
+from app.models.rating_histograms import GRADE_COLUMNS, GRADES, ProductRatingHistogram
+from app.models.reviews import Review as ReviewModel
+
+
+logger = logging.getLogger(__name__)
+
+
+def rating_expr(sum_expr, count_expr):
+    """
+    Средняя оценка из суммы и количества; 0, если оценок нет.
+    """
+    return case((count_expr > 0, cast(sum_expr, Float) / count_expr), else_=0.0)
+
+
+def histogram_sum_expr(histogram):
+    """
+    Сумма оценок по строке гистограммы.
+    """
+    return sum(grade * getattr(histogram, name) for grade, name in zip(GRADES, GRADE_COLUMNS))
+
+
+def histogram_count_expr(histogram):
+    """
+    Количество оценок по строке гистограммы.
+    """
+    return sum(getattr(histogram, name) for name in GRADE_COLUMNS)
+
+
+async def reconcile_product_ratings(db: AsyncSession) -> int:
+    """
+    Пересобирает гистограммы оценок по активным отзывам одним GROUP BY, затем
+    выравнивает по ним rating_sum, rating_count и rating товаров. Пишутся только
+    разошедшиеся строки. Возвращает число исправленных товаров.
+    Изменения, ещё не записанные очередью rating_queue, будут применены поверх результата,
+    поэтому запускать сверку лучше при пустой очереди (см. /metrics/rating-queue).
+    """
+    grade_counts = (
+        select(
+            ReviewModel.product_id,
+            *(
+                func.count().filter(ReviewModel.grade == grade).label(name)
+                for grade, name in zip(GRADES, GRADE_COLUMNS)
+            ),
+        )
+        .where(ReviewModel.is_active == True, ReviewModel.grade.in_(GRADES))
+        .group_by(ReviewModel.product_id)
+    )
+    histogram_insert = pg_insert(ProductRatingHistogram).from_select(
+        ["product_id", *GRADE_COLUMNS], grade_counts
+    )
+    await db.execute(
+        histogram_insert.on_conflict_do_update(
+            index_elements=[ProductRatingHistogram.product_id],
+            set_={name: getattr(histogram_insert.excluded, name) for name in GRADE_COLUMNS},
+            where=or_(*(
+                getattr(ProductRatingHistogram, name).is_distinct_from(getattr(histogram_insert.excluded, name))
+                for name in GRADE_COLUMNS
+            )),
+        )
+    )
+
+    has_reviews = exists().where(
+        ReviewModel.product_id == ProductRatingHistogram.product_id,
+        ReviewModel.is_active == True,
+        ReviewModel.grade.in_(GRADES),
+    )
+    await db.execute(
+        update(ProductRatingHistogram)
+        .where(histogram_count_expr(ProductRatingHistogram) != 0, ~has_reviews)
+        .values({name: 0 for name in GRADE_COLUMNS})
+    )
+
+    grade_sum = histogram_sum_expr(ProductRatingHistogram)
+    grade_count = histogram_count_expr(ProductRatingHistogram)
+    expected_rating = rating_expr(grade_sum, grade_count)
+    with_histogram = await db.execute(
+        update(ProductModel)
+        .where(
+            ProductModel.id == ProductRatingHistogram.product_id,
+            or_(
+                ProductModel.rating_sum.is_distinct_from(grade_sum),
+                ProductModel.rating_count.is_distinct_from(grade_count),
+                ProductModel.rating.is_distinct_from(expected_rating),
+            ),
+        )
+        .values(rating_sum=grade_sum, rating_count=grade_count, rating=expected_rating)
+    )
+
+    has_histogram = exists().where(ProductRatingHistogram.product_id == ProductModel.id)
+    without_histogram = await db.execute(
+        update(ProductModel)
+        .where(
+            or_(ProductModel.rating_sum != 0, ProductModel.rating_count != 0, ProductModel.rating != 0),
+            ~has_histogram,
+        )
+        .values(rating_sum=0, rating_count=0, rating=0.0)
+    )
+    return with_histogram.rowcount + without_histogram.rowcount
+
+
+async def _reconcile() -> None:
+    async with async_session_maker() as session:
+        fixed = await reconcile_product_ratings(session)
+        await session.commit()
+        if fixed:
+            await bump_collection_versions(session, PRODUCTS_VERSION)
+    logger.info("Ratings reconciled, products fixed: %d", fixed)
+
+
+if __name__ == "__main__":
+    # Исправление расхождений рейтингов: python -m app.ratings
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_reconcile())
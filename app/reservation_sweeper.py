@@ -0,0 +1,43 @@
+from app.background import PeriodicTask
+from app.cache import product_cache
+from app.conditional import bump_collection_versions
+from app.database import async_session_maker
+from app.models.products import PRODUCTS_VERSION
+from app.stock import expire_reservations
+
+
+class ReservationSweeper(PeriodicTask):
+    """
+    Фоновая задача, возвращающая на склад товары из неподтверждённых заказов,
+    у которых истёк срок резерва. Раз в interval секунд истёкшие заказы
+    обрабатываются пачками по batch_size, каждая пачка — в своей транзакции.
+    Состояние хранится только в базе: после перезапуска процесса резервы,
+    истёкшие за время простоя, освобождаются при первом проходе.
+    """
+
+    def __init__(self, interval: float = 30.0, batch_size: int = 500):
+        super().__init__(interval)
+        self.batch_size = batch_size
+
+    async def run_once(self) -> None:
+        await self.sweep()
+
+    async def sweep(self) -> int:
+        """
+        Освобождает все истёкшие резервы и возвращает количество обработанных заказов.
+        """
+        total = 0
+        while True:
+            async with async_session_maker() as session:
+                expired, quantities = await expire_reservations(session, self.batch_size)
+                await session.commit()
+                if quantities:
+                    await bump_collection_versions(session, PRODUCTS_VERSION)
+            for product_id in quantities:
+                product_cache.pop(product_id)
+            total += expired
+            if expired < self.batch_size:
+                return total
+
+
+reservation_sweeper = ReservationSweeper()
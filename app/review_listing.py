@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.reviews import Review as ReviewModel
+from app.pagination import decode_cursor, encode_cursor
+
+
+def review_filters(grade: int | None, user_id: int | None) -> list:
+    """
+    Условия WHERE для списка активных отзывов с необязательными фильтрами.
+    """
+    filters = [ReviewModel.is_active == True]
+    if grade is not None:
+        filters.append(ReviewModel.grade == grade)
+    if user_id is not None:
+        filters.append(ReviewModel.user_id == user_id)
+    return filters
+
+
+async def get_reviews_page(db: AsyncSession, filters: list, page_size: int, cursor: str | None) -> dict:
+    """
+    Страница отзывов от новых к старым с keyset-пагинацией по (comment_date, id).
+    """
+    if cursor is not None:
+        position = decode_cursor(cursor, "review", d=datetime.fromisoformat, id=int)
+        filters = [*filters, tuple_(ReviewModel.comment_date, ReviewModel.id) < tuple_(position["d"], position["id"])]
+
+    stmt = (
+        select(ReviewModel)
+        .where(*filters)
+        .order_by(ReviewModel.comment_date.desc(), ReviewModel.id.desc())
+        .limit(page_size + 1)
+    )
+    reviews = (await db.scalars(stmt)).all()
+
+    next_cursor = None
+    if len(reviews) > page_size:
+        reviews = reviews[:page_size]
+        last = reviews[-1]
+        next_cursor = encode_cursor({"o": "review", "d": last.comment_date.isoformat(), "id": last.id})
+
+    return {
+        "items": reviews,
+        "page_size": page_size,
+        "next_cursor": next_cursor,
+    }
@@ -1,110 +1,134 @@
 from decimal import Decimal
 from fastapi import APIRouter, Depends, HTTPException, Response, status
-from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
-from app.auth import get_current_user
+from app.auth import Principal, get_current_user
+from app.cache import TTLCache
+from app.cart_storage import cart_storage, get_active_products
 from app.db_depends import get_async_db
-from app.models.cart_items import CartItem as CartItemModel
-from app.models.products import Product as ProductModel
-from app.models.users import User as UserModel
 from app.schemas import (
     Cart as CartSchema,
+    CartBatchUpdate,
+    CartSummary as CartSummarySchema,
     CartItem as CartItemSchema,
     CartItemCreate,
+    CartItemOperation,
     CartItemUpdate,
 )
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 
+# Итоги корзин по ID пользователя; сбрасываются при изменении корзины.
+# Изменение цены товара попадает в итоги не позже чем через ttl секунд.
+cart_summary_cache = TTLCache(maxsize=10000, ttl=30, name="cart_summary")
 
-async def _ensure_product_available(db: AsyncSession, product_id: int) -> None:
-    """Проверить что товар в наличии"""
-    result = await db.scalars(
-        select(ProductModel).where(
-            ProductModel.id == product_id,
-            ProductModel.is_active == True,
-        )
-    )
-    product = result.first()
-    if not product:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Product not found or inactive",
-        )
 
+async def _load_cart(db: AsyncSession, user_id: int) -> CartSchema:
+    """Загрузить корзину пользователя с товарами и посчитать итоги"""
+    items = [CartItemSchema.model_validate(item) for item in await cart_storage.get_items(db, user_id)]
 
-async def _get_cart_item(
-    db: AsyncSession, user_id: int, product_id: int
-) -> CartItemModel | None:
-    """Проверка наличия товара в корзине пользователя"""
-    result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
-        .where(
-            CartItemModel.user_id == user_id,
-            CartItemModel.product_id == product_id,
-        )
+    total_quantity = sum(item.quantity for item in items)
+    total_price_decimal = sum((Decimal(item.quantity) * item.product.price for item in items), Decimal("0"))
+
+    return CartSchema(
+        user_id=user_id,
+        items=items,
+        total_quantity=total_quantity,
+        total_price=total_price_decimal
     )
-    return result.first()
+
+
+def _collapse_operations(operations: list[CartItemOperation]) -> dict[int, tuple[str, int | None]]:
+    """
+    Сводит операции к одной итоговой на товар с сохранением порядка их применения:
+    set после increment перекрывает его, increment после set или remove превращается в set.
+    """
+    collapsed: dict[int, tuple[str, int | None]] = {}
+    for operation in operations:
+        previous = collapsed.get(operation.product_id)
+        if operation.op != "increment" or previous is None:
+            collapsed[operation.product_id] = (operation.op, operation.quantity)
+        elif previous[0] == "remove":
+            collapsed[operation.product_id] = ("set", operation.quantity)
+        else:
+            collapsed[operation.product_id] = (previous[0], previous[1] + operation.quantity)
+    return collapsed
 
 
 @router.get("/", response_model=CartSchema)
 async def get_cart(
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Получить содержимое корзины пользователя"""
-    result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
-        .where(CartItemModel.user_id == current_user.id)
-        .order_by(CartItemModel.id)
-    )
-    items = result.all()
+    return await _load_cart(db, current_user.id)
 
-    total_quantity = sum(item.quantity for item in items)
-    price_items = (
-        Decimal(item.quantity) *
-        (item.product.price if item.product.price is not None else Decimal("0"))
-        for item in items
-    )
-    total_price_decimal = sum(price_items, Decimal("0"))
 
-    return CartSchema(
-        user_id=current_user.id,
-        items=items,
-        total_quantity=total_quantity,
-        total_price=total_price_decimal
-    )
+@router.get("/summary", response_model=CartSummarySchema)
+async def get_cart_summary(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Получить итоги корзины (количество и стоимость) одним агрегирующим запросом"""
+    summary = cart_summary_cache.get(current_user.id)
+    if summary is None:
+        total_quantity, total_price = await cart_storage.get_totals(db, current_user.id)
+        summary = CartSummarySchema(
+            user_id=current_user.id,
+            total_quantity=total_quantity,
+            total_price=total_price,
+        )
+        cart_summary_cache.set(current_user.id, summary)
+    return summary
 
 
 @router.post("/items", response_model=CartItemSchema, status_code=status.HTTP_201_CREATED)
 async def add_item_to_cart(
     payload: CartItemCreate,
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Добавить товар в козину"""
-    # Проверка наличия товара
-    await _ensure_product_available(db, payload.product_id)
-
-    # Проверка наличия товара в корзине пользователя
-    cart_item = await _get_cart_item(db, current_user.id, payload.product_id)
-    if cart_item:
-        cart_item.quantity += payload.quantity
-    else:
-        cart_item = CartItemModel(
-            user_id=current_user.id,
-            product_id=payload.product_id,
-            quantity=payload.quantity,
+    cart_item = await cart_storage.add_item(db, current_user.id, payload.product_id, payload.quantity)
+    if cart_item is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found or inactive",
         )
-        db.add(cart_item)
 
-    await db.commit()
-    updated_item = await _get_cart_item(db, current_user.id, payload.product_id)
-    return updated_item
+    cart_summary_cache.pop(current_user.id)
+    return cart_item
+
+
+@router.patch("/items", response_model=CartSchema)
+async def update_cart_items(
+    payload: CartBatchUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    Пакетно изменить корзину: операции set/increment/remove применяются вместе.
+    Наличие всех товаров проверяется по кэшу и не более чем одним запросом; в Postgres-хранилище
+    изменения записываются одной транзакцией из не более чем двух многострочных upsert и одного DELETE.
+    """
+    collapsed = _collapse_operations(payload.operations)
+    sets = {product_id: quantity for product_id, (op, quantity) in collapsed.items() if op == "set"}
+    increments = {product_id: quantity for product_id, (op, quantity) in collapsed.items() if op == "increment"}
+    removes = [product_id for product_id, (op, _) in collapsed.items() if op == "remove"]
+
+    wanted = [*sets, *increments]
+    if wanted:
+        available = await get_active_products(db, wanted)
+        missing = sorted(set(wanted) - set(available))
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail={"message": "Product not found or inactive", "product_ids": missing},
+            )
+
+    await cart_storage.apply(db, current_user.id, sets, increments, removes)
+    cart_summary_cache.pop(current_user.id)
+    return await _load_cart(db, current_user.id)
 
 
 @router.put("/items/{product_id}", response_model=CartItemSchema)
@@ -112,46 +136,43 @@ async def update_cart_item(
     product_id: int,
     payload: CartItemUpdate,
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Обновить количество товара в корзине пользователя"""
-    # Проверка наличия товара
-    await _ensure_product_available(db, product_id)
-
-    # Проверка наличия товара в корзине пользователя
-    cart_item = await _get_cart_item(db, current_user.id, product_id)
-
-    if not cart_item:
+    cart_item = await cart_storage.set_item(db, current_user.id, product_id, payload.quantity)
+    if cart_item is None:
+        # Уточняем причину только в редком случае промаха
+        if product_id not in await get_active_products(db, [product_id]):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found or inactive",
+            )
         raise HTTPException(status_code=404, detail="Cart item not found")
 
-    cart_item.quantity = payload.quantity
-    await db.commit()
-    updated_item = await _get_cart_item(db, current_user.id, product_id)
-    return updated_item
+    cart_summary_cache.pop(current_user.id)
+    return cart_item
 
 
 @router.delete("/items/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def remove_item_from_cart(
     product_id: int,
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Удалить товар из корзины"""
-    cart_item = await _get_cart_item(db, current_user.id, product_id)
-    if not cart_item:
+    if not await cart_storage.remove_item(db, current_user.id, product_id):
         raise HTTPException(status_code=404, detail="Cart item not found")
 
-    await db.delete(cart_item)
-    await db.commit()
+    cart_summary_cache.pop(current_user.id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
 async def clear_cart(
     db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     """Очистить корзину"""
-    await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id))
-    await db.commit()
+    await cart_storage.clear(db, current_user.id)
+    cart_summary_cache.pop(current_user.id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth import get_current_admin
+from app.auth import Principal, get_current_admin
+from app.category_tree import (
+    add_category_to_closure, build_category_tree, category_ancestors, category_tree_cache,
+    is_in_subtree, move_category_in_closure,
+)
+from app.conditional import etag_matches
 from app.db_depends import get_async_db
 from app.models.categories import Category as CategoryModel
-from app.models.users import User as UserModel
-from app.schemas import Category as CategorySchema, CategoryCreate
+from app.schemas import Category as CategorySchema, CategoryCreate, CategoryTreeNode
 
 
 # Создаём маршрутизатор с префиксом и тегом
@@ -26,11 +30,45 @@ async def get_all_categories(db: AsyncSession = Depends(get_async_db)):
     return categories
 
 
+@router.get("/tree", response_model=list[CategoryTreeNode])
+async def get_category_tree(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Возвращает дерево активных категорий.
+    Дерево строится один раз и пересобирается только после изменения категорий;
+    запрос с совпадающим If-None-Match получает 304 без обращения к базе.
+    """
+    cached = category_tree_cache.get()
+    if cached is None:
+        version = category_tree_cache.version
+        result = await db.scalars(
+            select(CategoryModel).where(CategoryModel.is_active == True).order_by(CategoryModel.id)
+        )
+        cached = category_tree_cache.set(version, build_category_tree(result.all()))
+
+    payload, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+
+@router.get("/{category_id}/breadcrumbs", response_model=list[CategorySchema])
+async def get_category_breadcrumbs(category_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Возвращает цепочку категорий от корня до указанной категории.
+    """
+    result = await db.scalars(category_ancestors(category_id))
+    breadcrumbs = result.all()
+    if not breadcrumbs or not all(category.is_active for category in breadcrumbs):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+    return breadcrumbs
+
+
 @router.post("/", response_model=CategorySchema, status_code=status.HTTP_201_CREATED)
 async def create_category(
         category: CategoryCreate,
         db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_admin)
+        current_user: Principal = Depends(get_current_admin)
 ):
     """
     Создаёт новую категорию.
@@ -47,7 +85,10 @@ async def create_category(
     # Создание новой категории
     db_category = CategoryModel(**category.model_dump(), admin_id=current_user.id)
     db.add(db_category)
+    await db.flush()
+    await add_category_to_closure(db, db_category.id, db_category.parent_id)
     await db.commit()
+    category_tree_cache.bump()
     # db.refresh(db_category)
     return db_category
 
@@ -57,7 +98,7 @@ async def update_category(
         category_id: int,
         category: CategoryCreate,
         db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_admin)
+        current_user: Principal = Depends(get_current_admin)
 ):
     """
     Обновляет категорию по её ID.
@@ -82,14 +123,24 @@ async def update_category(
         if parent is None:
             raise HTTPException(status_code=400, detail="Parent category not found")
 
-    # Обновление категории
     update_data = category.model_dump(exclude_unset=True)
+    parent_changed = "parent_id" in update_data and update_data["parent_id"] != db_category.parent_id
+
+    # Категорию нельзя перенести внутрь её собственного поддерева
+    if parent_changed and category.parent_id is not None:
+        if await is_in_subtree(db, category_id, category.parent_id):
+            raise HTTPException(status_code=400, detail="Category cannot be moved into its own subtree")
+
+    # Обновление категории
     await db.execute(
         update(CategoryModel)
         .where(CategoryModel.id == category_id)
         .values(**update_data)
     )
+    if parent_changed:
+        await move_category_in_closure(db, category_id, category.parent_id)
     await db.commit()
+    category_tree_cache.bump()
     # db.refresh(db_category)
     return db_category
 
@@ -98,10 +149,12 @@ async def update_category(
 async def delete_category(
         category_id: int,
         db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_admin)
+        current_user: Principal = Depends(get_current_admin)
 ):
     """
     Выполняет мягкое удаление категории по её ID, устанавливая is_active = False.
+    Структура дерева в таблице замыкания не меняется: неактивные ветки
+    отсекаются при выборке поддерева.
     """
     stmt = select(CategoryModel).where(CategoryModel.id == category_id,
                                        CategoryModel.is_active == True)
@@ -119,4 +172,5 @@ async def delete_category(
         .values(is_active=False)
     )
     await db.commit()
+    category_tree_cache.bump()
     return db_category
@@ -0,0 +1,185 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.auth import Principal, get_current_user
+from app.cache import product_cache
+from app.cart_storage import cart_storage
+from app.conditional import bump_collection_versions
+from app.db_depends import get_async_db
+from app.models.cart_items import CartItem as CartItemModel
+from app.models.orders import Order as OrderModel, OrderItem as OrderItemModel
+from app.models.products import PRODUCTS_VERSION
+from app.pagination import decode_cursor, encode_cursor
+from app.routers.cart import cart_summary_cache
+from app.schemas import Order as OrderSchema, OrderPage
+from app.stock import order_quantities, release_stock, reserve_stock
+
+
+router = APIRouter(prefix="/orders", tags=["orders"])
+
+# Сколько неподтверждённый заказ держит товар на складе
+ORDER_RESERVATION_MINUTES = 15
+
+
+async def _get_order(db: AsyncSession, order_id: int, user_id: int) -> OrderModel:
+    """Заказ пользователя вместе с позициями или 404"""
+    result = await db.scalars(
+        select(OrderModel)
+        .options(selectinload(OrderModel.items))
+        .where(OrderModel.id == order_id, OrderModel.user_id == user_id)
+    )
+    order = result.first()
+    if order is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    return order
+
+
+async def _change_reserved_order(db: AsyncSession, order_id: int, user_id: int, *conditions, **values) -> None:
+    """
+    Переводит неподтверждённый заказ в другой статус одним UPDATE с проверкой статуса.
+    При промахе уточняет причину: 404 — заказа нет, 409 — заказ уже не ждёт подтверждения.
+    """
+    result = await db.scalars(
+        update(OrderModel)
+        .where(
+            OrderModel.id == order_id,
+            OrderModel.user_id == user_id,
+            OrderModel.status == "reserved",
+            *conditions,
+        )
+        .values(expires_at=None, **values)
+        .returning(OrderModel.id)
+    )
+    if result.first() is None:
+        await _get_order(db, order_id, user_id)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Order is not awaiting confirmation")
+
+
+@router.get("/", response_model=OrderPage)
+async def get_orders(
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(
+        None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Получить заказы пользователя от новых к старым"""
+    filters = [OrderModel.user_id == current_user.id]
+    if cursor is not None:
+        position = decode_cursor(cursor, "order", id=int)
+        filters.append(OrderModel.id < position["id"])
+
+    result = await db.scalars(
+        select(OrderModel)
+        .options(selectinload(OrderModel.items))
+        .where(*filters)
+        .order_by(OrderModel.id.desc())
+        .limit(page_size + 1)
+    )
+    orders = result.all()
+
+    next_cursor = None
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        next_cursor = encode_cursor({"o": "order", "id": orders[-1].id})
+
+    return {"items": orders, "page_size": page_size, "next_cursor": next_cursor}
+
+
+@router.post("/checkout", response_model=OrderSchema, status_code=status.HTTP_201_CREATED)
+async def checkout(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    Оформить заказ из корзины и зарезервировать товар на складе.
+    Корзина забирается одним DELETE ... RETURNING, остатки списываются одним условным
+    UPDATE по всем товарам. Если хотя бы одного товара не хватает, транзакция
+    откатывается целиком (корзина остаётся как была) и возвращается 409 со списком товаров.
+    Заказ нужно подтвердить в течение ORDER_RESERVATION_MINUTES, иначе резерв снимается.
+    """
+    # Корзина из хранилища с отложенной записью должна оказаться в cart_items до чтения,
+    # а изменения корзины во время оформления — подождать его окончания
+    async with cart_storage.sql_access(current_user.id):
+        result = await db.execute(
+            delete(CartItemModel)
+            .where(CartItemModel.user_id == current_user.id)
+            .returning(CartItemModel.product_id, CartItemModel.quantity)
+        )
+        quantities = {product_id: quantity for product_id, quantity in result}
+        if not quantities:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cart is empty")
+
+        prices = await reserve_stock(db, quantities)
+        insufficient = sorted(set(quantities) - set(prices))
+        if insufficient:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={"message": "Insufficient stock", "product_ids": insufficient},
+            )
+
+        order = OrderModel(
+            user_id=current_user.id,
+            status="reserved",
+            total_price=sum(prices[product_id] * quantity for product_id, quantity in quantities.items()),
+            expires_at=datetime.now(timezone.utc) + timedelta(minutes=ORDER_RESERVATION_MINUTES),
+            items=[
+                OrderItemModel(product_id=product_id, quantity=quantity, unit_price=prices[product_id])
+                for product_id, quantity in sorted(quantities.items())
+            ],
+        )
+        db.add(order)
+        await db.commit()
+
+    await bump_collection_versions(db, PRODUCTS_VERSION)
+    for product_id in quantities:
+        product_cache.pop(product_id)
+    cart_summary_cache.pop(current_user.id)
+    return order
+
+
+@router.get("/{order_id}", response_model=OrderSchema)
+async def get_order(
+    order_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Получить заказ пользователя"""
+    return await _get_order(db, order_id, current_user.id)
+
+
+@router.post("/{order_id}/confirm", response_model=OrderSchema)
+async def confirm_order(
+    order_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Подтвердить заказ, пока не истёк срок резерва"""
+    await _change_reserved_order(
+        db, order_id, current_user.id, OrderModel.expires_at > func.now(), status="confirmed"
+    )
+    await db.commit()
+    return await _get_order(db, order_id, current_user.id)
+
+
+@router.post("/{order_id}/cancel", response_model=OrderSchema)
+async def cancel_order(
+    order_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
+):
+    """Отменить неподтверждённый заказ и вернуть товар на склад"""
+    await _change_reserved_order(db, order_id, current_user.id, status="cancelled")
+    quantities = await order_quantities(db, [order_id])
+    await release_stock(db, quantities)
+    await db.commit()
+    await bump_collection_versions(db, PRODUCTS_VERSION)
+
+    for product_id in quantities:
+        product_cache.pop(product_id)
+    return await _get_order(db, order_id, current_user.id)
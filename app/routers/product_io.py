@@ -0,0 +1,328 @@
+import codecs
+import csv
+import io
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import Integer, any_, column, func, insert, literal, select, table, text, true
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
+
+from app.auth import Principal, get_current_seller
+from app.conditional import bump_collection_versions
+from app.database import async_session_maker
+from app.db_depends import get_async_db
+from app.models.categories import Category as CategoryModel
+from app.models.products import PRODUCTS_VERSION, Product as ProductModel
+from app.routers.products import product_list_options, serialize_product
+from app.schemas import Product as ProductSchema, ProductCreate, ProductImportResult
+
+
+# Маршруты пакетной загрузки и выгрузки каталога.
+# Подключается раньше products.router, чтобы /products/export не попадал в /{product_id}.
+router = APIRouter(
+    prefix="/products",
+    tags=["products"],
+)
+
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+IMPORT_COLUMNS = ("name", "description", "price", "image_url", "stock", "category_id")
+# Предел длины одной CSV-записи: корректная строка товара намного короче
+IMPORT_MAX_RECORD_CHARS = 16 * 1024
+
+# Сколько строк за раз забирается из серверного курсора при выгрузке
+EXPORT_FETCH_SIZE = 1000
+EXPORT_COLUMNS = tuple(ProductSchema.model_fields)
+# Запас, вычитаемый из отметки X-Export-Started-At: транзакции, начавшиеся раньше выгрузки
+# и зафиксированные после неё, попадут в следующую инкрементальную выгрузку, если длились меньше
+EXPORT_WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Временная таблица живёт до конца транзакции импорта
+IMPORT_STAGING_TABLE = "products_import_staging"
+import_staging = table(IMPORT_STAGING_TABLE, *(column(name) for name in IMPORT_COLUMNS))
+
+
+async def _iter_lines(request: Request) -> AsyncIterator[str]:
+    """
+    Читает тело запроса потоком и отдаёт его по строкам.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+async def _iter_csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[dict | str]:
+    """
+    Разбирает CSV с заголовком. Поле в кавычках может занимать несколько строк.
+    Вместо некорректной записи отдаётся текст ошибки. Запись с незакрытой кавычкой
+    копится не дольше IMPORT_MAX_RECORD_CHARS символов, после чего отбрасывается,
+    и разбор продолжается со следующей строки.
+    """
+    header = None
+    pending = ""
+    line_number = 0
+    record_start = 1
+    async for line in lines:
+        line_number += 1
+        if not pending:
+            record_start = line_number
+        pending += line
+        if pending.count('"') % 2:
+            if len(pending) > IMPORT_MAX_RECORD_CHARS:
+                pending = ""
+                yield (
+                    f"Unterminated quoted field at line {record_start}: "
+                    f"record exceeds {IMPORT_MAX_RECORD_CHARS} characters"
+                )
+            continue
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield f"Malformed row at line {record_start}: expected {len(header)} fields, got {len(values)}"
+            continue
+        yield {name: value if value != "" else None for name, value in zip(header, values)}
+    if pending.strip():
+        yield f"Unterminated quoted field at line {record_start}"
+
+
+async def _iter_ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[dict | str]:
+    """
+    Разбирает NDJSON: один JSON-объект на строку. Вместо некорректной строки отдаётся текст ошибки.
+    """
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield "Malformed row: invalid JSON"
+            continue
+        yield row if isinstance(row, dict) else "Malformed row: expected a JSON object"
+
+
+def _detect_import_format(request: Request, import_format: str | None) -> str:
+    if import_format is not None:
+        return import_format
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return "ndjson"
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Send text/csv or application/x-ndjson, or pass format explicitly",
+    )
+
+
+class _ImportReport:
+    """Счётчики и ограниченный по размеру список ошибок импорта."""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.errors_truncated = False
+
+    def add_error(self, row: int, errors: list[str]) -> None:
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "errors": errors})
+        else:
+            self.errors_truncated = True
+
+
+async def _copy_chunk(
+        db: AsyncSession,
+        driver_connection,
+        chunk: list[tuple[int, ProductCreate]],
+        categories: dict[int, bool],
+        report: _ImportReport,
+) -> None:
+    """
+    Проверяет категории чанка (каждую — один раз за импорт) и загружает строки через COPY.
+    """
+    unknown = list({product.category_id for _, product in chunk if product.category_id not in categories})
+    if unknown:
+        result = await db.scalars(
+            select(CategoryModel.id).where(
+                CategoryModel.id == any_(literal(unknown, ARRAY(Integer))),
+                CategoryModel.is_active == True,
+            )
+        )
+        found = set(result.all())
+        for category_id in unknown:
+            categories[category_id] = category_id in found
+
+    records = []
+    for row_number, product in chunk:
+        if not categories[product.category_id]:
+            report.add_error(row_number, ["category_id: Category not found or inactive"])
+            continue
+        records.append(tuple(getattr(product, name) for name in IMPORT_COLUMNS))
+
+    if records:
+        await driver_connection.copy_records_to_table(
+            IMPORT_STAGING_TABLE, records=records, columns=IMPORT_COLUMNS
+        )
+        report.imported += len(records)
+
+
+@router.post("/import", response_model=ProductImportResult)
+async def import_products(
+        request: Request,
+        import_format: Literal["csv", "ndjson"] | None = Query(
+            None, alias="format", description="Формат тела: csv или ndjson (по умолчанию — по Content-Type)"),
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_seller)
+):
+    """
+    Загружает товары продавца из CSV (с заголовком) или NDJSON, переданного в теле запроса.
+    Файл читается потоком, строки проверяются по ProductCreate чанками и загружаются
+    через COPY во временную таблицу, откуда переносятся в products одним INSERT ... SELECT.
+    Некорректные строки пропускаются и попадают в отчёт.
+    """
+    import_format = _detect_import_format(request, import_format)
+    lines = _iter_lines(request)
+    rows = _iter_csv_rows(lines) if import_format == "csv" else _iter_ndjson_rows(lines)
+
+    await db.execute(text(
+        f"CREATE TEMP TABLE {IMPORT_STAGING_TABLE} ("
+        "name varchar(100), description varchar(500), price numeric(10, 2), "
+        "image_url varchar(200), stock integer, category_id integer"
+        ") ON COMMIT DROP"
+    ))
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+
+    report = _ImportReport()
+    categories: dict[int, bool] = {}
+    chunk: list[tuple[int, ProductCreate]] = []
+    row_number = 0
+    async for row in rows:
+        row_number += 1
+        if isinstance(row, str):
+            report.add_error(row_number, [row])
+            continue
+        try:
+            chunk.append((row_number, ProductCreate.model_validate(row)))
+        except ValidationError as exc:
+            report.add_error(row_number, [
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                for error in exc.errors()
+            ])
+            continue
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await _copy_chunk(db, driver_connection, chunk, categories, report)
+            chunk = []
+    if chunk:
+        await _copy_chunk(db, driver_connection, chunk, categories, report)
+
+    if report.imported:
+        await db.execute(
+            insert(ProductModel).from_select(
+                [*IMPORT_COLUMNS, "seller_id", "is_active", "updated_at"],
+                select(
+                    *(import_staging.c[name] for name in IMPORT_COLUMNS),
+                    literal(current_user.id),
+                    true(),
+                    func.clock_timestamp(),
+                ),
+            )
+        )
+    await db.commit()
+    if report.imported:
+        await bump_collection_versions(db, PRODUCTS_VERSION)
+
+    return {
+        "imported": report.imported,
+        "failed": report.failed,
+        "errors": report.errors,
+        "errors_truncated": report.errors_truncated,
+    }
+
+
+async def _export_chunks(session: AsyncSession, stmt, export_format: str) -> AsyncIterator[bytes]:
+    """
+    Читает товары серверным курсором порциями по EXPORT_FETCH_SIZE и отдаёт их по мере чтения.
+    Сессия закрывается здесь по окончании или обрыву чтения, а если тело так и не начали
+    читать (клиент отключился раньше) — фоновой задачей ответа.
+    """
+    async with session:
+        result = await session.stream_scalars(stmt.execution_options(yield_per=EXPORT_FETCH_SIZE))
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            async for partition in result.partitions():
+                for product in partition:
+                    row = ProductSchema.model_validate(product).model_dump(mode="json")
+                    writer.writerow(row[name] for name in EXPORT_COLUMNS)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode()
+        else:
+            async for partition in result.partitions():
+                yield b"".join(serialize_product(product) + b"\n" for product in partition)
+
+
+@router.get("/export")
+async def export_products(
+        export_format: Literal["ndjson", "csv"] = Query(
+            "ndjson", alias="format", description="Формат выгрузки: ndjson или csv"),
+        since: datetime | None = Query(
+            None, description="Только товары, изменённые после этого момента (включая снятые с продажи)"),
+):
+    """
+    Потоково выгружает каталог в NDJSON или CSV, память не зависит от размера каталога.
+    Без since выгружаются все активные товары; с since — все изменённые товары,
+    в том числе ставшие неактивными, чтобы потребитель мог снять их с витрины.
+    Заголовок X-Export-Started-At можно передать как since в следующей выгрузке. Отметка
+    берётся по часам базы и сдвинута назад на EXPORT_WATERMARK_OVERLAP, поэтому соседние
+    инкрементальные выгрузки пересекаются: потребитель должен считать выгрузку доставкой
+    «хотя бы один раз» и применять товары идемпотентно по id.
+    """
+    # Сессия живёт дольше обработчика (ответ отдаётся после выхода из него), поэтому её
+    # закрывает генератор тела, а фоновая задача StreamingResponse — если тело не читалось
+    session = async_session_maker()
+    try:
+        started_at = await session.scalar(select(func.now())) - EXPORT_WATERMARK_OVERLAP
+    except BaseException:
+        await session.close()
+        raise
+    stmt = select(ProductModel).options(*product_list_options).order_by(ProductModel.id)
+    if since is None:
+        stmt = stmt.where(ProductModel.is_active == True)
+    else:
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        stmt = stmt.where(ProductModel.updated_at > since)
+
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_chunks(session, stmt, export_format),
+        media_type=media_type,
+        headers={"X-Export-Started-At": started_at.isoformat()},
+        background=BackgroundTask(session.close),
+    )
@@ -1,14 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import select, update, func, desc, and_
+import json
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy import select, update, func, desc, and_, or_, case, any_, literal, Integer, exists
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 
-from app.auth import get_current_seller
+from app.auth import Principal, get_current_seller
+from app.cache import TTLCache, cart_product_cache, product_cache
+from app.category_tree import category_subtree_ids
+from app.conditional import (
+    bump_collection_versions, collection_version, is_conditional, make_etag, not_modified, validator_headers,
+)
 from app.db_depends import get_async_db
+from app.explain import explain_plan
 from app.models.categories import Category as CategoryModel
-from app.models.products import Product as ProductModel
-from app.models.reviews import Review as ReviewModel
-from app.models.users import User as UserModel
-from app.schemas import Product as ProductSchema, ProductCreate, Review as ReviewSchema, ProductList
+from app.models.products import PRODUCTS_VERSION, Product as ProductModel
+from app.models.rating_histograms import GRADE_COLUMNS, GRADES, ProductRatingHistogram
+from app.models.reviews import REVIEWS_VERSION, Review as ReviewModel
+from app.pagination import decode_cursor, encode_cursor
+from app.review_listing import get_reviews_page, review_filters
+from app.schemas import (
+    Product as ProductSchema, ProductCreate, ReviewPage, ProductList, ProductFacets,
+    ProductBatch, ProductBatchRequest, ProductPage, ReviewSummary,
+)
+from app.search import SearchMode, build_search
 
 
 
@@ -19,25 +38,102 @@ router = APIRouter(
 )
 
 
-@router.get("/", response_model=ProductList)
-async def get_all_products(
-        page: int = Query(1, ge=1),
-        page_size: int = Query(20, ge=1, le=100),
-        category_id: int | None = Query(
-            None, description="ID категории для фильтрации"),
-        search: str | None = Query(None, min_length=1, description="Поиск по названию товара"),
-        min_price: float | None = Query(
-            None, ge=0, description="Минимальная цена товара"),
-        max_price: float | None = Query(
-            None, ge=0, description="Максимальная цена товара"),
-        in_stock: bool | None = Query(
-            None, description="true — только товары в наличии, false — только без остатка"),
-        seller_id: int | None = Query(
-            None, description="ID продавца для фильтрации"),
-        db: AsyncSession = Depends(get_async_db),
+# Кэш общего количества товаров для count_mode=cached, ключ — нормализованный набор фильтров
+product_count_cache = TTLCache(maxsize=1024, ttl=60, name="product_count")
+
+# Кэш фасетов GET /products/facets, ключ — нормализованный набор фильтров
+product_facets_cache = TTLCache(maxsize=512, ttl=60, name="product_facets")
+
+# Максимальное количество ID в пакетном запросе товаров
+PRODUCT_BATCH_MAX_IDS = 500
+
+# Границы ценовых диапазонов для фасетов
+PRICE_BUCKET_BOUNDS = (0, 500, 1000, 5000, 10000, 50000)
+
+def serialize_product(product: ProductModel) -> bytes:
+    """
+    Сериализует товар в JSON так же, как его отдаёт GET /products/{product_id}.
+    """
+    return ProductSchema.model_validate(product).model_dump_json().encode()
+
+
+# Колонки products, из которых строится схема Product (без tsv и служебных полей)
+PRODUCT_SCHEMA_COLUMNS = tuple(getattr(ProductModel, name) for name in ProductSchema.model_fields)
+
+# Опции загрузки ORM-объектов для списков: только поля схемы Product
+product_list_options = (load_only(*PRODUCT_SCHEMA_COLUMNS),)
+
+_product_list_adapter = TypeAdapter(ProductList)
+
+
+def render_product_list(payload: dict) -> bytes:
+    """
+    Проверяет словарь страницы товаров по ProductList и сразу сериализует в JSON-байты.
+    """
+    return _product_list_adapter.dump_json(_product_list_adapter.validate_python(payload))
+
+
+def _product_etag(product_id: int, updated_at: datetime) -> str:
+    return make_etag("product", product_id, updated_at.isoformat())
+
+
+async def get_product_entries(db: AsyncSession, product_ids: list[int]) -> dict[int, tuple[bytes, datetime]]:
+    """
+    Возвращает JSON и updated_at активных товаров по ID: из кэша, а недостающие — одним запросом.
+    """
+    entries = {}
+    to_fetch = []
+    for product_id in product_ids:
+        entry = product_cache.get(product_id)
+        if entry is None:
+            to_fetch.append(product_id)
+        else:
+            entries[product_id] = entry
+
+    if to_fetch:
+        # Товар, изменённый и сброшенный из кэша во время чтения, в кэш не попадёт
+        token = product_cache.token()
+        stmt = select(ProductModel).where(
+            ProductModel.is_active == True,
+            ProductModel.id == any_(literal(to_fetch, ARRAY(Integer))),
+        )
+        for product in (await db.scalars(stmt)).all():
+            entry = (serialize_product(product), product.updated_at)
+            product_cache.set(product.id, entry, token=token)
+            entries[product.id] = entry
+
+    return entries
+
+
+async def get_product_payloads(db: AsyncSession, product_ids: list[int]) -> dict[int, bytes]:
+    """
+    Возвращает JSON активных товаров по ID.
+    """
+    entries = await get_product_entries(db, product_ids)
+    return {product_id: payload for product_id, (payload, _) in entries.items()}
+
+
+def _product_batch_response(product_ids: list[int], payloads: dict[int, bytes]) -> Response:
+    """
+    Собирает ответ ProductBatch из готовых JSON товаров без повторной сериализации.
+    """
+    items = b",".join(payloads[product_id] for product_id in product_ids if product_id in payloads)
+    missing = [product_id for product_id in product_ids if product_id not in payloads]
+    content = b'{"items":[' + items + b'],"missing":' + json.dumps(missing).encode() + b"}"
+    return Response(content=content, media_type="application/json")
+
+
+def _build_product_filters(
+        category_id: int | None,
+        search: str | None,
+        min_price: float | None,
+        max_price: float | None,
+        in_stock: bool | None,
+        seller_id: int | None,
+        search_mode: SearchMode = "fulltext",
 ):
     """
-    Возвращает список всех активных товаров.
+    Строит список условий WHERE для выборки товаров и выражение ранга для поиска.
     """
     # Проверка логики min_price <= max_price
     if min_price is not None and max_price is not None and min_price > max_price:
@@ -51,11 +147,6 @@ async def get_all_products(
     if category_id is not None:
         filters.append(ProductModel.category_id == category_id)
 
-    if search is not None:
-        search_value = search.strip()
-        if search_value:
-            filters.append(func.lower(ProductModel.name).like(f"%{search_value.lower()}%"))
-
     if min_price is not None:
         filters.append(ProductModel.price >= min_price)
 
@@ -68,58 +159,266 @@ async def get_all_products(
     if seller_id is not None:
         filters.append(ProductModel.seller_id == seller_id)
 
-    # Базовый запрос total
-    total_stmt = select(func.count()).select_from(ProductModel).where(*filters)
+    rank_expr = None
+    search_value = search.strip() if search is not None else ""
+    if search_value:
+        search_filter, rank_expr = build_search(search_value, search_mode)
+        filters.append(search_filter)
+
+    return filters, rank_expr
+
+
+def _product_filters_key(
+        category_id: int | None,
+        search: str | None,
+        min_price: float | None,
+        max_price: float | None,
+        in_stock: bool | None,
+        seller_id: int | None,
+        search_mode: SearchMode = "fulltext",
+) -> tuple:
+    """
+    Нормализованный ключ набора фильтров: одинаковые по смыслу запросы дают один ключ.
+    """
+    search_value = " ".join(search.lower().split()) if search else None
+    return (
+        category_id, search_value or None, search_mode if search_value else None,
+        min_price, max_price, in_stock, seller_id,
+    )
+
+
+async def _count_products(db: AsyncSession, filters: list, count_mode: str, cache_key: tuple) -> int | None:
+    """
+    Считает общее количество товаров выбранной стратегией.
+    """
+    if count_mode == "none":
+        return None
+
+    count_stmt = select(func.count()).select_from(ProductModel).where(*filters)
+
+    if count_mode == "estimated":
+        # Оценка планировщика: без выполнения запроса, по статистике таблицы
+        plan = await explain_plan(db, select(ProductModel.id).where(*filters))
+        return int(plan["Plan Rows"])
+
+    if count_mode == "cached":
+        total = product_count_cache.get(cache_key)
+        if total is None:
+            total = await db.scalar(count_stmt) or 0
+            product_count_cache.set(cache_key, total)
+        return total
 
-    rank_col = None
-    if search:
-        search_value = search.strip()
-        if search_value:
-            ts_query = func.websearch_to_tsquery('english', search_value)
-            filters.append(ProductModel.tsv.op('@@')(ts_query))
-            rank_col = func.ts_rank_cd(ProductModel.tsv, ts_query).label("rank")
-            # total с учётом полнотекстового фильтра
-            total_stmt = select(func.count()).select_from(ProductModel).where(*filters)
+    return await db.scalar(count_stmt) or 0
 
-    total = await db.scalar(total_stmt) or 0
+
+@router.get("/", response_model=ProductList)
+async def get_all_products(
+        request: Request,
+        response: Response,
+        page: int = Query(1, ge=1),
+        page_size: int = Query(20, ge=1, le=100),
+        cursor: str | None = Query(
+            None, description="Курсор следующей страницы (next_cursor из предыдущего ответа), заменяет page"),
+        count_mode: Literal["exact", "estimated", "cached", "none"] = Query(
+            "exact", description="Способ подсчёта total: точно, оценка планировщика, из кэша или без подсчёта"),
+        category_id: int | None = Query(
+            None, description="ID категории для фильтрации"),
+        search: str | None = Query(None, min_length=1, description="Поиск по названию товара"),
+        search_mode: SearchMode = Query(
+            "fulltext", description="Режим поиска: fulltext, substring (подстрока в названии) или hybrid"),
+        min_price: float | None = Query(
+            None, ge=0, description="Минимальная цена товара"),
+        max_price: float | None = Query(
+            None, ge=0, description="Максимальная цена товара"),
+        in_stock: bool | None = Query(
+            None, description="true — только товары в наличии, false — только без остатка"),
+        seller_id: int | None = Query(
+            None, description="ID продавца для фильтрации"),
+        fast: bool = Query(
+            False, description="Быстрый ответ: выборка только нужных колонок и сериализация сразу в JSON"),
+        db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Возвращает список всех активных товаров.
+    Поддерживает OFFSET-пагинацию (page) и keyset-пагинацию (cursor).
+    В режиме fast строки выбираются по колонкам схемы Product и сериализуются
+    заранее собранным TypeAdapter, минуя ORM-объекты и jsonable_encoder.
+    Поддерживает условный GET: ETag строится из параметров запроса и версии
+    коллекции товаров, поэтому перепроверка стоит чтения одной последовательности.
+    """
+    version = await collection_version(db, request, PRODUCTS_VERSION)
+    etag = make_etag("products", request.url.query, version)
+    headers = validator_headers(etag, None)
+    if not_modified(request, etag, None):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+    filters, rank_expr = _build_product_filters(
+        category_id, search, min_price, max_price, in_stock, seller_id, search_mode
+    )
+    cache_key = _product_filters_key(
+        category_id, search, min_price, max_price, in_stock, seller_id, search_mode
+    )
+    total = await _count_products(db, filters, count_mode, cache_key)
+
+    # Позиция, с которой продолжается выдача при keyset-пагинации
+    page_filters = []
+    if cursor is not None:
+        if rank_expr is not None:
+            position = decode_cursor(cursor, f"rank:{search_mode}", id=int, r=float)
+            page_filters.append(or_(
+                rank_expr < position["r"],
+                and_(rank_expr == position["r"], ProductModel.id > position["id"]),
+            ))
+        else:
+            position = decode_cursor(cursor, "id", id=int)
+            page_filters.append(ProductModel.id > position["id"])
 
     # Основной запрос (если есть поиск — добавим ранг в выборку и сортировку)
-    if rank_col is not None:
+    columns = PRODUCT_SCHEMA_COLUMNS if fast else (ProductModel,)
+    options = () if fast else product_list_options
+    if rank_expr is not None:
+        rank_col = rank_expr.label("rank")
         products_stmt = (
-            select(ProductModel, rank_col)
-            .where(*filters)
+            select(*columns, rank_col)
+            .options(*options)
+            .where(*filters, *page_filters)
             .order_by(desc(rank_col), ProductModel.id)
-            .offset((page - 1) * page_size)
-            .limit(page_size)
         )
-        result = await db.execute(products_stmt)
-        rows = result.all()
-        items = [row[0] for row in rows]    # сами объекты
-        # при желании можно вернуть ранг в ответе
-        # ranks = [row.rank for row in rows]
     else:
         products_stmt = (
-            select(ProductModel)
-            .where(*filters)
+            select(*columns)
+            .options(*options)
+            .where(*filters, *page_filters)
             .order_by(ProductModel.id)
-            .offset((page - 1) * page_size)
-            .limit(page_size)
         )
-        items = (await db.scalars(products_stmt)).all()
+    if cursor is None:
+        products_stmt = products_stmt.offset((page - 1) * page_size)
+    # Лишняя строка показывает, есть ли следующая страница
+    result = await db.execute(products_stmt.limit(page_size + 1))
+    rows = result.all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if fast:
+        items = [dict(row._mapping) for row in rows]    # словари колонок
+    else:
+        items = [row[0] for row in rows]    # сами объекты
 
-    return {
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        last_id = last.id if fast else last[0].id
+        if rank_expr is not None:
+            next_cursor = encode_cursor({"o": f"rank:{search_mode}", "r": last.rank, "id": last_id})
+        else:
+            next_cursor = encode_cursor({"o": "id", "id": last_id})
+
+    payload = {
         "items": items,
         "total": total,
+        "total_mode": count_mode,
         "page": page,
-        "page_size": page_size
+        "page_size": page_size,
+        "next_cursor": next_cursor,
     }
+    if fast:
+        return Response(content=render_product_list(payload), media_type="application/json", headers=headers)
+    return payload
+
+
+@router.get("/facets", response_model=ProductFacets)
+async def get_product_facets(
+        category_id: int | None = Query(
+            None, description="ID категории для фильтрации"),
+        search: str | None = Query(None, min_length=1, description="Поиск по названию товара"),
+        search_mode: SearchMode = Query(
+            "fulltext", description="Режим поиска: fulltext, substring (подстрока в названии) или hybrid"),
+        min_price: float | None = Query(
+            None, ge=0, description="Минимальная цена товара"),
+        max_price: float | None = Query(
+            None, ge=0, description="Максимальная цена товара"),
+        in_stock: bool | None = Query(
+            None, description="true — только товары в наличии, false — только без остатка"),
+        seller_id: int | None = Query(
+            None, description="ID продавца для фильтрации"),
+        cached: bool = Query(True, description="Разрешить ответ из кэша фасетов"),
+        db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Возвращает количество товаров по категориям, ценовым диапазонам и наличию
+    для тех же фильтров, что и список товаров. Все фасеты считаются одним запросом.
+    """
+    filters, _ = _build_product_filters(
+        category_id, search, min_price, max_price, in_stock, seller_id, search_mode
+    )
+    cache_key = _product_filters_key(
+        category_id, search, min_price, max_price, in_stock, seller_id, search_mode
+    )
+    if cached:
+        facets = product_facets_cache.get(cache_key)
+        if facets is not None:
+            return facets
+
+    upper_bounds = PRICE_BUCKET_BOUNDS[1:]
+    price_bucket = case(
+        *((ProductModel.price < bound, index) for index, bound in enumerate(upper_bounds)),
+        else_=len(upper_bounds),
+    )
+    base = (
+        select(
+            ProductModel.category_id.label("category_id"),
+            price_bucket.label("price_bucket"),
+            (ProductModel.stock > 0).label("in_stock"),
+        )
+        .where(*filters)
+        .subquery()
+    )
+    # Один проход по отфильтрованным товарам: группировка сразу по трём наборам
+    stmt = select(
+        base.c.category_id,
+        base.c.price_bucket,
+        base.c.in_stock,
+        func.grouping(base.c.category_id).label("g_category"),
+        func.grouping(base.c.price_bucket).label("g_price"),
+        func.count().label("count"),
+    ).group_by(func.grouping_sets(base.c.category_id, base.c.price_bucket, base.c.in_stock))
+    rows = (await db.execute(stmt)).all()
+
+    categories = []
+    bucket_counts = {}
+    stock_counts = {True: 0, False: 0}
+    for row in rows:
+        if row.g_category == 0:
+            categories.append({"category_id": row.category_id, "count": row.count})
+        elif row.g_price == 0:
+            bucket_counts[row.price_bucket] = row.count
+        else:
+            stock_counts[row.in_stock] = row.count
+
+    price_buckets = [
+        {
+            "min_price": bound,
+            "max_price": upper_bounds[index] if index < len(upper_bounds) else None,
+            "count": bucket_counts.get(index, 0),
+        }
+        for index, bound in enumerate(PRICE_BUCKET_BOUNDS)
+    ]
+    facets = ProductFacets(
+        total=stock_counts[True] + stock_counts[False],
+        categories=sorted(categories, key=lambda facet: facet["category_id"]),
+        price_buckets=price_buckets,
+        in_stock=stock_counts[True],
+        out_of_stock=stock_counts[False],
+    )
+    product_facets_cache.set(cache_key, facets)
+    return facets
 
 
 @router.post("/", response_model=ProductSchema, status_code=status.HTTP_201_CREATED)
 async def create_product(
         product: ProductCreate,
         db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_seller)
+        current_user: Principal = Depends(get_current_seller)
 ):
     """
     Создаёт новый продукт.
@@ -137,17 +436,23 @@ async def create_product(
     db_product = ProductModel(**product.model_dump(), seller_id=current_user.id)
     db.add(db_product)
     await db.commit()
+    await bump_collection_versions(db, PRODUCTS_VERSION)
     #db.refresh(db_product)
     return db_product
 
 
-@router.get("/products/category/{category_id}", response_model=list[ProductSchema])
+@router.get("/products/category/{category_id}", response_model=ProductPage)
 async def get_products_by_category(
         category_id: int,
+        page_size: int = Query(20, ge=1, le=100),
+        cursor: str | None = Query(
+            None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+        include_descendants: bool = Query(
+            False, description="Включить товары всех активных подкатегорий"),
         db: AsyncSession = Depends(get_async_db),
 ):
     """
-    Возвращает список товаров в указанной категории по её ID.
+    Возвращает страницу товаров в указанной категории по её ID (keyset-пагинация по id).
     """
     stmt = select(CategoryModel).where(CategoryModel.id == category_id, CategoryModel.is_active == True)
     result = await db.scalars(stmt)
@@ -155,31 +460,102 @@ async def get_products_by_category(
     if category is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
 
-    stmt_product = select(ProductModel).where(
-        ProductModel.is_active == True, ProductModel.category_id == category_id
+    filters = [ProductModel.is_active == True]
+    if include_descendants:
+        filters.append(ProductModel.category_id.in_(category_subtree_ids(category_id)))
+    else:
+        filters.append(ProductModel.category_id == category_id)
+
+    if cursor is not None:
+        position = decode_cursor(cursor, "id", id=int)
+        filters.append(ProductModel.id > position["id"])
+
+    stmt_product = (
+        select(ProductModel)
+        .options(*product_list_options)
+        .where(*filters)
+        .order_by(ProductModel.id)
+        .limit(page_size + 1)
     )
     result2 = await db.scalars(stmt_product)
     products = result2.all()
-    if category is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Products not found")
 
-    return products
+    next_cursor = None
+    if len(products) > page_size:
+        products = products[:page_size]
+        next_cursor = encode_cursor({"o": "id", "id": products[-1].id})
+
+    return {
+        "items": products,
+        "page_size": page_size,
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get("/batch", response_model=ProductBatch)
+async def get_products_batch(
+        ids: list[int] = Query(description="ID товаров (до 500)"),
+        db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Возвращает несколько товаров одним запросом в порядке переданных ID.
+    """
+    product_ids = list(dict.fromkeys(ids))
+    if len(product_ids) > PRODUCT_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"No more than {PRODUCT_BATCH_MAX_IDS} ids per request",
+        )
+    payloads = await get_product_payloads(db, product_ids)
+    return _product_batch_response(product_ids, payloads)
+
+
+@router.post("/batch", response_model=ProductBatch)
+async def post_products_batch(
+        body: ProductBatchRequest,
+        db: AsyncSession = Depends(get_async_db),
+):
+    """
+    То же, что GET /products/batch, но список ID передаётся в теле запроса.
+    """
+    product_ids = list(dict.fromkeys(body.ids))
+    payloads = await get_product_payloads(db, product_ids)
+    return _product_batch_response(product_ids, payloads)
 
 
 @router.get("/{product_id}", response_model=ProductSchema)
-async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+async def get_product(product_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Возвращает детальную информацию о товаре по его ID.
+    Горячие товары отдаются из кэша без обращения к базе.
+    Поддерживает условный GET (ETag / Last-Modified): перепроверка без кэша
+    стоит одного чтения updated_at по первичному ключу.
     """
-    stmt_product = select(ProductModel).where(
-        ProductModel.is_active == True, ProductModel.id == product_id
-    )
-    result = await db.scalars(stmt_product)
-    product = result.first()
-    if product is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-
-    return product
+    entry = product_cache.get(product_id)
+    if entry is None and is_conditional(request):
+        updated_at = await db.scalar(
+            select(ProductModel.updated_at).where(
+                ProductModel.is_active == True, ProductModel.id == product_id
+            )
+        )
+        if updated_at is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+        etag = _product_etag(product_id, updated_at)
+        if not_modified(request, etag, updated_at):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag, updated_at)
+            )
+
+    if entry is None:
+        entry = (await get_product_entries(db, [product_id])).get(product_id)
+        if entry is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+
+    payload, updated_at = entry
+    headers = validator_headers(_product_etag(product_id, updated_at), updated_at)
+    if not_modified(request, headers["ETag"], updated_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
 
 
 @router.put("/{product_id}", response_model=ProductSchema)
@@ -187,7 +563,7 @@ async def update_product(
         product_id: int,
         product_update: ProductCreate,
         db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_seller)
+        current_user: Principal = Depends(get_current_seller)
 ):
     """
     Обновляет товар по его ID.
@@ -218,6 +594,9 @@ async def update_product(
         .values(**product_update.model_dump())
     )
     await db.commit()
+    product_cache.pop(product_id)
+    cart_product_cache.pop(product_id)
+    await bump_collection_versions(db, PRODUCTS_VERSION)
     #db.refresh(product)
     return product
 
@@ -226,68 +605,111 @@ async def update_product(
 async def delete_product(
         product_id: int,
         db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_seller)
+        current_user: Principal = Depends(get_current_seller)
 ):
     """
     Удаляет товар по его ID.
     """
-    # Проверка существования активной категории
-    stmt = select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True)
+    # Проверка существования активного товара: нужен только продавец
+    stmt = select(ProductModel.seller_id).where(ProductModel.id == product_id, ProductModel.is_active == True)
 
-    result = await db.scalars(stmt)
-    product = result.first()
-    if product is None:
+    seller_id = await db.scalar(stmt)
+    if seller_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
 
-    if product.seller_id != current_user.id:
+    if seller_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="You can only delete your own products")
 
     # Логическое удаление категории (установка is_active=False)
     await db.execute(update(ProductModel).where(ProductModel.id == product_id).values(is_active=False))
     await db.commit()
+    product_cache.pop(product_id)
+    cart_product_cache.pop(product_id)
+    await bump_collection_versions(db, PRODUCTS_VERSION)
 
     return {"status": "success", "message": "Product marked as inactive"}
 
-@router.get("/{product_id}/reviews/", response_model=list[ReviewSchema])
-async def get_all_reviews_by_product_id(
-        product_id: int,
-        db: AsyncSession = Depends(get_async_db)
-):
-    stmt = select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True)
-    db_product = await db.scalars(stmt)
-
-    product = db_product.first()
-
-    if product is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-
-    reviews_stmt = select(ReviewModel).where(
-        ReviewModel.product_id == product_id, ReviewModel.is_active == True
+def _review_summary_stmt():
+    return (
+        select(ProductModel.id, *(getattr(ProductRatingHistogram, name) for name in GRADE_COLUMNS))
+        .outerjoin(ProductRatingHistogram, ProductRatingHistogram.product_id == ProductModel.id)
+        .where(ProductModel.is_active == True)
     )
-    reviews = await db.scalars(reviews_stmt)
 
-    return reviews.all()
+
+def _review_summary(row) -> dict:
+    grades = {grade: getattr(row, name) or 0 for grade, name in zip(GRADES, GRADE_COLUMNS)}
+    review_count = sum(grades.values())
+    grade_sum = sum(grade * count for grade, count in grades.items())
+    return {
+        "product_id": row.id,
+        "rating": grade_sum / review_count if review_count else 0.0,
+        "review_count": review_count,
+        "grades": grades,
+    }
 
 
-async def update_product_rating(
-        db: AsyncSession,
-        product_id: int
+@router.get("/reviews/summary", response_model=list[ReviewSummary])
+async def get_review_summaries(
+        ids: list[int] = Query(description="ID товаров (до 500)"),
+        db: AsyncSession = Depends(get_async_db),
 ):
-    """result = await db.execute(
-        select(func.avg(ReviewModel.grade)).where(
-            ReviewModel.product_id == product_id,
-            ReviewModel.is_active == True
+    """
+    Сводки отзывов для нескольких товаров (для страниц списков) одним запросом.
+    Неактивные и несуществующие товары пропускаются.
+    """
+    product_ids = list(dict.fromkeys(ids))
+    if len(product_ids) > PRODUCT_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"No more than {PRODUCT_BATCH_MAX_IDS} ids per request",
         )
-    )"""
     result = await db.execute(
-        select(func.avg(ReviewModel.grade)).where(
-            ReviewModel.product_id == product_id,
-            ReviewModel.is_active == True
-        )
+        _review_summary_stmt().where(ProductModel.id == any_(literal(product_ids, ARRAY(Integer))))
     )
-    avg_rating = result.scalar() or 0.0
-    product = await db.get(ProductModel, product_id)
-    #product = db.get(ProductModel, product_id)
-    product.rating = avg_rating
-    await db.commit()
-    #db.commit()
\ No newline at end of file
+    summaries = {row.id: _review_summary(row) for row in result.all()}
+    return [summaries[product_id] for product_id in product_ids if product_id in summaries]
+
+
+@router.get("/{product_id}/reviews/summary", response_model=ReviewSummary)
+async def get_review_summary(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Сводка отзывов о товаре: средняя оценка, количество и распределение по оценкам.
+    Читается одной строкой гистограммы по первичному ключу.
+    """
+    result = await db.execute(_review_summary_stmt().where(ProductModel.id == product_id))
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    return _review_summary(row)
+
+
+@router.get("/{product_id}/reviews/", response_model=ReviewPage)
+async def get_all_reviews_by_product_id(
+        product_id: int,
+        request: Request,
+        response: Response,
+        page_size: int = Query(20, ge=1, le=100),
+        cursor: str | None = Query(
+            None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+        grade: int | None = Query(None, ge=1, le=5, description="Только отзывы с этой оценкой"),
+        user_id: int | None = Query(None, description="Только отзывы этого пользователя"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Возвращает страницу отзывов о товаре от новых к старым.
+    Поддерживает условный GET по версии коллекции отзывов.
+    """
+    version = await collection_version(db, request, REVIEWS_VERSION)
+    etag = make_etag("product-reviews", product_id, request.url.query, version)
+    headers = validator_headers(etag, None)
+    if not_modified(request, etag, None):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+    stmt = select(exists().where(ProductModel.id == product_id, ProductModel.is_active == True))
+    if not await db.scalar(stmt):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+
+    filters = [ReviewModel.product_id == product_id, *review_filters(grade, user_id)]
+    return await get_reviews_page(db, filters, page_size, cursor)
@@ -1,14 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select, update
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import exists, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth import get_current_admin, get_current_user
+from app.auth import Principal, get_current_admin, get_current_user
+from app.conditional import bump_collection_versions, collection_version, make_etag, not_modified, validator_headers
 from app.db_depends import get_async_db
 from app.models.products import Product as ProductModel
-from app.models.reviews import Review as ReviewModel
-from app.models.users import User as UserModel
-from app.routers.products import update_product_rating
-from app.schemas import Review as ReviewSchema, ReviewCreate
+from app.models.reviews import REVIEWS_VERSION, Review as ReviewModel
+from app.rating_queue import rating_queue
+from app.review_listing import get_reviews_page, review_filters
+from app.schemas import Review as ReviewSchema, ReviewCreate, ReviewPage
 
 # Создаём маршрутизатор для товаров
 router = APIRouter(
@@ -16,28 +17,39 @@ router = APIRouter(
     tags=["reviews"],
 )
 
-@router.get("/", response_model=list[ReviewSchema])
-async def get_all_reviews(db: AsyncSession = Depends(get_async_db)):
-    """Получить список всех отзывов"""
-    stmt = select(ReviewModel).where(ReviewModel.is_active == True)
-    result = await db.scalars(stmt)
-    return result.all()
+@router.get("/", response_model=ReviewPage)
+async def get_all_reviews(
+        request: Request,
+        response: Response,
+        page_size: int = Query(20, ge=1, le=100),
+        cursor: str | None = Query(
+            None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+        grade: int | None = Query(None, ge=1, le=5, description="Только отзывы с этой оценкой"),
+        user_id: int | None = Query(None, description="Только отзывы этого пользователя"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """Получить страницу отзывов от новых к старым. Поддерживает условный GET по версии коллекции отзывов"""
+    version = await collection_version(db, request, REVIEWS_VERSION)
+    etag = make_etag("reviews", request.url.query, version)
+    headers = validator_headers(etag, None)
+    if not_modified(request, etag, None):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+    return await get_reviews_page(db, review_filters(grade, user_id), page_size, cursor)
 
 
 @router.post("/", response_model=ReviewSchema)
 async def create_review(
         review: ReviewCreate,
         db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ):
     """Создание отзыва о продукте"""
     if review.product_id is not None:
-        stmt = select(ProductModel).where(ProductModel.id == review.product_id,
-                                           ProductModel.is_active == True)
-        db_product = await db.scalars(stmt)
-
-        product = db_product.first()
-        if product is None:
+        stmt = select(exists().where(ProductModel.id == review.product_id,
+                                     ProductModel.is_active == True))
+        if not await db.scalar(stmt):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
 
     if current_user.role != "buyer":
@@ -46,15 +58,16 @@ async def create_review(
     db_review = ReviewModel(**review.model_dump(), user_id=current_user.id)
     db.add(db_review)
     await db.commit()
-    #db.refresh(db_review)
-    await update_product_rating(product_id=review.product_id, db=db)
+    await bump_collection_versions(db, REVIEWS_VERSION)
+    # Рейтинг товара обновится фоновой очередью вместе с другими отзывами
+    rating_queue.enqueue(review.product_id, review.grade, 1)
     return db_review
 
 @router.delete("/{review_id}")
 async def delete_review(
         review_id: int,
         db: AsyncSession = Depends(get_async_db),
-        current_user: UserModel = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ):
     """Удаление отзыва о продукте"""
 
@@ -67,7 +80,15 @@ async def delete_review(
     if current_user.role != "admin" or current_user.id != review.user_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
 
-    await db.execute(update(ReviewModel).where(ReviewModel.id == review_id).values(is_active=False))
+    # Условие is_active защищает от двойного вычитания оценки при параллельном удалении
+    result = await db.execute(
+        update(ReviewModel)
+        .where(ReviewModel.id == review_id, ReviewModel.is_active == True)
+        .values(is_active=False)
+    )
     await db.commit()
-    await update_product_rating(product_id=review.product_id, db=db)
+    if result.rowcount:
+        await bump_collection_versions(db, REVIEWS_VERSION)
+    if result.rowcount and review.grade is not None:
+        rating_queue.enqueue(review.product_id, review.grade, -1)
     return {"status": "success", "message": "Review marked as inactive"}
\ No newline at end of file
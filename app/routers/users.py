@@ -5,7 +5,7 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.auth import hash_password, verify_password, create_access_token, create_refresh_token
+from app.auth import hash_password_async, verify_password_async, create_access_token, create_refresh_token
 from app.config import SECRET_KEY, ALGORITHM
 from app.db_depends import get_async_db
 from app.models.users import User as UserModel
@@ -30,7 +30,7 @@ async def create_user_async(user: UserCreate, db: AsyncSession = Depends(get_asy
     # Создание объекта пользователя с хешированным паролем
     db_user = UserModel(
         email=user.email,
-        hashed_password=hash_password(user.password),
+        hashed_password=await hash_password_async(user.password),
         role=user.role
     )
 
@@ -51,7 +51,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(),
         select(UserModel).where(UserModel.email == form_data.username, UserModel.is_active == True))
     user = result.first()
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
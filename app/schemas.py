@@ -1,6 +1,7 @@
 from datetime import datetime
+from typing import Literal
 
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, model_validator
 from decimal import Decimal
 
 
@@ -27,6 +28,16 @@ class Category(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CategoryTreeNode(BaseModel):
+    """
+    Узел дерева категорий.
+    """
+    id: int = Field(description="Уникальный идентификатор категории")
+    name: str = Field(description="Название категории")
+    parent_id: int | None = Field(None, description="ID родительской категории, если есть")
+    children: list["CategoryTreeNode"] = Field(default_factory=list, description="Дочерние категории")
+
+
 class ProductCreate(BaseModel):
     """
     Модель для создания и обновления товара.
@@ -65,13 +76,75 @@ class ProductList(BaseModel):
     Список пагинации для товаров.
     """
     items: list[Product] = Field(description="Товары для текущей страницы")
-    total: int = Field(ge=0, description="Общее количество товаров")
+    total: int | None = Field(None, ge=0, description="Общее количество товаров (None при count_mode=none)")
+    total_mode: str = Field("exact", description="Способ подсчёта total: exact, estimated, cached или none")
     page: int = Field(ge=1, description="Номер текущей страницы")
     page_size: int = Field(ge=1, description="Количество элементов на странице")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, если она есть")
 
     model_config = ConfigDict(from_attributes=True)  # Для чтения из ORM-объектов
 
 
+class ProductPage(BaseModel):
+    """
+    Страница товаров при keyset-пагинации.
+    """
+    items: list[Product] = Field(description="Товары для текущей страницы")
+    page_size: int = Field(ge=1, description="Количество элементов на странице")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, если она есть")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ProductBatchRequest(BaseModel):
+    """Запрос пакетного получения товаров по списку ID."""
+    ids: list[int] = Field(min_length=1, max_length=500, description="ID товаров (до 500)")
+
+
+class ProductBatch(BaseModel):
+    """Товары в порядке запроса и ID, которые не найдены или неактивны."""
+    items: list[Product] = Field(description="Найденные товары в порядке запроса")
+    missing: list[int] = Field(description="ID не найденных или неактивных товаров")
+
+
+class CategoryFacet(BaseModel):
+    """Количество товаров в категории."""
+    category_id: int = Field(description="ID категории")
+    count: int = Field(ge=0, description="Количество товаров")
+
+
+class PriceBucketFacet(BaseModel):
+    """Количество товаров в ценовом диапазоне [min_price, max_price)."""
+    min_price: Decimal = Field(description="Нижняя граница цены (включительно)")
+    max_price: Decimal | None = Field(None, description="Верхняя граница цены (не включительно), None — без границы")
+    count: int = Field(ge=0, description="Количество товаров")
+
+
+class ProductFacets(BaseModel):
+    """
+    Фасеты для боковой панели каталога по тем же фильтрам, что и список товаров.
+    """
+    total: int = Field(ge=0, description="Общее количество товаров")
+    categories: list[CategoryFacet] = Field(description="Количество товаров по категориям")
+    price_buckets: list[PriceBucketFacet] = Field(description="Количество товаров по ценовым диапазонам")
+    in_stock: int = Field(ge=0, description="Товаров в наличии")
+    out_of_stock: int = Field(ge=0, description="Товаров без остатка")
+
+
+class ProductImportError(BaseModel):
+    """Ошибка в строке импортируемого файла."""
+    row: int = Field(description="Номер строки данных (с 1, без заголовка CSV)")
+    errors: list[str] = Field(description="Описание ошибок")
+
+
+class ProductImportResult(BaseModel):
+    """Итог пакетного импорта товаров."""
+    imported: int = Field(ge=0, description="Количество загруженных товаров")
+    failed: int = Field(ge=0, description="Количество отклонённых строк")
+    errors: list[ProductImportError] = Field(description="Ошибки по строкам")
+    errors_truncated: bool = Field(False, description="В отчёт попали не все ошибки")
+
+
 class UserCreate(BaseModel):
     """Модель для создания пользователя сервисы"""
     email: EmailStr = Field(description="Email пользователя")
@@ -110,6 +183,21 @@ class Review(BaseModel):
     is_active: bool
 
 
+class ReviewPage(BaseModel):
+    """Страница отзывов при keyset-пагинации"""
+    items: list[Review] = Field(description="Отзывы для текущей страницы")
+    page_size: int = Field(ge=1, description="Количество элементов на странице")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, если она есть")
+
+
+class ReviewSummary(BaseModel):
+    """Сводка отзывов о товаре: средняя оценка и распределение оценок"""
+    product_id: int = Field(description="ID товара")
+    rating: float = Field(description="Средняя оценка")
+    review_count: int = Field(ge=0, description="Количество отзывов с оценкой")
+    grades: dict[int, int] = Field(description="Количество отзывов по оценкам 1–5")
+
+
 class CartItemBase(BaseModel):
     """Базовая модель товара корзины"""
     product_id: int = Field(description="ID товара")
@@ -127,9 +215,29 @@ class CartItemUpdate(BaseModel):
     quantity: int = Field(..., ge=1, description="Новое количество товара")
 
 
+class CartItemOperation(BaseModel):
+    """Одна операция пакетного изменения корзины."""
+    op: Literal["set", "increment", "remove"] = Field(
+        ..., description="set — задать количество, increment — добавить, remove — удалить позицию")
+    product_id: int = Field(..., description="ID товара")
+    quantity: int | None = Field(None, ge=1, description="Количество для set и increment")
+
+    @model_validator(mode="after")
+    def check_quantity(self):
+        if self.op != "remove" and self.quantity is None:
+            raise ValueError(f"quantity is required for {self.op}")
+        return self
+
+
+class CartBatchUpdate(BaseModel):
+    """Список операций над корзиной, применяемых в одной транзакции по порядку."""
+    operations: list[CartItemOperation] = Field(
+        ..., min_length=1, max_length=500, description="Операции над корзиной")
+
+
 class CartItem(BaseModel):
     """Товар в корзине с данными продукта."""
-    id: int = Field(..., description="ID позиции корзины")
+    id: int | None = Field(None, description="ID позиции корзины (нет, пока корзина не записана в базу)")
     quantity: int = Field(..., ge=1, description="Количество товара")
     product: Product = Field(..., description="Информация о товаре")
 
@@ -144,3 +252,40 @@ class Cart(BaseModel):
     total_price: Decimal = Field(..., ge=0, description="Общая стоимость товаров")
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class CartSummary(BaseModel):
+    """Итоги корзины пользователя без списка товаров."""
+    user_id: int = Field(..., description="ID пользователя")
+    total_quantity: int = Field(..., ge=0, description="Общее количество товаров")
+    total_price: Decimal = Field(..., ge=0, description="Общая стоимость товаров")
+
+
+class OrderItem(BaseModel):
+    """Позиция заказа с ценой на момент оформления."""
+    id: int = Field(..., description="ID позиции заказа")
+    product_id: int = Field(..., description="ID товара")
+    quantity: int = Field(..., ge=1, description="Количество товара")
+    unit_price: Decimal = Field(..., description="Цена за единицу на момент оформления")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class Order(BaseModel):
+    """Заказ пользователя."""
+    id: int = Field(..., description="ID заказа")
+    user_id: int = Field(..., description="ID пользователя")
+    status: Literal["reserved", "confirmed", "cancelled", "expired"] = Field(..., description="Статус заказа")
+    total_price: Decimal = Field(..., ge=0, description="Общая стоимость заказа")
+    created_at: datetime = Field(..., description="Дата оформления")
+    expires_at: datetime | None = Field(None, description="Срок резерва для неподтверждённого заказа")
+    items: list[OrderItem] = Field(default_factory=list, description="Позиции заказа")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class OrderPage(BaseModel):
+    """Страница заказов при keyset-пагинации"""
+    items: list[Order] = Field(description="Заказы для текущей страницы")
+    page_size: int = Field(ge=1, description="Количество элементов на странице")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, если она есть")
@@ -0,0 +1,40 @@
+from typing import Literal
+
+from sqlalchemy import func, or_
+
+from app.models.products import Product as ProductModel
+
+
+# fulltext  — полнотекстовый поиск по tsv (индекс ix_products_tsv_gin)
+# substring — поиск подстроки в названии (триграммный индекс ix_products_name_trgm)
+# hybrid    — совпадение любым из двух способов, ранг — лучший из двух
+SearchMode = Literal["fulltext", "substring", "hybrid"]
+
+
+def escape_like(value: str) -> str:
+    """
+    Экранирует спецсимволы LIKE, чтобы ввод пользователя искался буквально.
+    """
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_search(search_value: str, mode: SearchMode = "fulltext"):
+    """
+    Возвращает условие WHERE и выражение ранга для поиска товаров.
+    Каждый режим опирается на GIN-индекс и планируется как индексное сканирование.
+    """
+    name_lower = func.lower(ProductModel.name)
+    value_lower = search_value.lower()
+
+    ts_query = func.websearch_to_tsquery('english', search_value)
+    fulltext_filter = ProductModel.tsv.op('@@')(ts_query)
+    fulltext_rank = func.ts_rank_cd(ProductModel.tsv, ts_query)
+
+    substring_filter = name_lower.like(f"%{escape_like(value_lower)}%", escape="\\")
+    substring_rank = func.similarity(name_lower, value_lower)
+
+    if mode == "substring":
+        return substring_filter, substring_rank
+    if mode == "hybrid":
+        return or_(fulltext_filter, substring_filter), func.greatest(fulltext_rank, substring_rank)
+    return fulltext_filter, fulltext_rank
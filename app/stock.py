@@ -0,0 +1,114 @@
+from decimal import Decimal
+
+from sqlalchemy import Integer, any_, column, func, literal, select, update, values
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.orders import Order as OrderModel, OrderItem as OrderItemModel
+from app.models.products import Product as ProductModel
+
+
+def _requested(quantities: dict[int, int]):
+    return values(
+        column("product_id", Integer),
+        column("quantity", Integer),
+        name="requested",
+    ).data(sorted(quantities.items()))
+
+
+def locked_products(requested, *conditions):
+    """
+    CTE, блокирующий строки товаров из requested (VALUES с колонкой product_id)
+    строго по возрастанию id. Все транзакции, массово меняющие товары, берут
+    блокировки через него и в одном порядке, поэтому ждут друг друга,
+    но не попадают во взаимную блокировку.
+    FOR NO KEY UPDATE не мешает вставке строк, ссылающихся на товар по внешнему ключу.
+    """
+    return (
+        select(ProductModel.id)
+        .join(requested, requested.c.product_id == ProductModel.id)
+        .where(*conditions)
+        .order_by(ProductModel.id)
+        .with_for_update(of=ProductModel, key_share=True)
+        .cte("locked_products")
+    )
+
+
+async def reserve_stock(db: AsyncSession, quantities: dict[int, int]) -> dict[int, Decimal]:
+    """
+    Списывает со склада количества {product_id: quantity} одним условным UPDATE:
+    stock = stock - q только там, где товар активен и stock >= q.
+    Возвращает цены списанных товаров. Если списаны не все товары, вызывающая
+    сторона должна откатить транзакцию — резерв делается целиком или никак.
+    """
+    requested = _requested(quantities)
+    locked = locked_products(
+        requested,
+        ProductModel.is_active == True,
+        ProductModel.stock >= requested.c.quantity,
+    )
+    result = await db.execute(
+        update(ProductModel)
+        .where(
+            ProductModel.id == locked.c.id,
+            ProductModel.id == requested.c.product_id,
+            ProductModel.stock >= requested.c.quantity,
+        )
+        .values(stock=ProductModel.stock - requested.c.quantity)
+        .returning(ProductModel.id, ProductModel.price)
+    )
+    return {row.id: row.price for row in result}
+
+
+async def release_stock(db: AsyncSession, quantities: dict[int, int]) -> None:
+    """
+    Возвращает на склад количества {product_id: quantity} с тем же порядком блокировок.
+    """
+    requested = _requested(quantities)
+    locked = locked_products(requested)
+    await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == locked.c.id, ProductModel.id == requested.c.product_id)
+        .values(stock=ProductModel.stock + requested.c.quantity)
+    )
+
+
+async def order_quantities(db: AsyncSession, order_ids: list[int]) -> dict[int, int]:
+    """
+    Суммарные количества товаров в указанных заказах: {product_id: quantity}.
+    """
+    result = await db.execute(
+        select(OrderItemModel.product_id, func.sum(OrderItemModel.quantity))
+        .where(OrderItemModel.order_id == any_(literal(order_ids, ARRAY(Integer))))
+        .group_by(OrderItemModel.product_id)
+    )
+    return {product_id: quantity for product_id, quantity in result}
+
+
+async def expire_reservations(db: AsyncSession, limit: int) -> tuple[int, dict[int, int]]:
+    """
+    Помечает до limit истёкших резервов как expired и возвращает их товары на склад.
+    Заказы, которые прямо сейчас подтверждаются или отменяются, пропускаются (SKIP LOCKED).
+    Возвращает число истёкших заказов и количества, возвращённые на склад.
+    Фиксация транзакции — на вызывающей стороне.
+    """
+    expired = (
+        select(OrderModel.id)
+        .where(OrderModel.status == "reserved", OrderModel.expires_at <= func.now())
+        .order_by(OrderModel.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .cte("expired_orders")
+    )
+    result = await db.scalars(
+        update(OrderModel)
+        .where(OrderModel.id == expired.c.id)
+        .values(status="expired", expires_at=None)
+        .returning(OrderModel.id)
+    )
+    order_ids = result.all()
+    if not order_ids:
+        return 0, {}
+    quantities = await order_quantities(db, order_ids)
+    await release_stock(db, quantities)
+    return len(order_ids), quantities
@@ -0,0 +1,116 @@
+"""
+Нагрузочный тест резервирования одного «горячего» товара: множество параллельных
+покупателей списывают остаток одного product_id, как во время распродажи.
+atomic — reserve_stock (условный UPDATE ... WHERE stock >= q с блокировкой в порядке id),
+naive  — прочитать остаток, проверить его в Python и записать stock = прочитанное - q.
+Скрипт выставляет товару начальный остаток, по окончании сверяет проданное
+со списанным со склада и возвращает исходный остаток. Запускать на тестовой базе.
+
+Запуск из корня проекта:
+python -m benchmarks.checkout_hot_sku --product-id 1 --stock 1000 --buyers 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import DATABASE_URL
+from app.models.products import Product as ProductModel
+from app.stock import reserve_stock
+
+
+async def atomic_attempt(session: AsyncSession, product_id: int, quantity: int) -> bool:
+    reserved = await reserve_stock(session, {product_id: quantity})
+    return product_id in reserved
+
+
+async def naive_attempt(session: AsyncSession, product_id: int, quantity: int) -> bool:
+    stock = await session.scalar(select(ProductModel.stock).where(ProductModel.id == product_id))
+    if stock < quantity:
+        return False
+    await session.execute(
+        update(ProductModel).where(ProductModel.id == product_id).values(stock=stock - quantity)
+    )
+    return True
+
+
+ATTEMPTS = {"atomic": atomic_attempt, "naive": naive_attempt}
+
+
+async def run(args: argparse.Namespace) -> None:
+    engine = create_async_engine(DATABASE_URL, pool_size=args.concurrency, max_overflow=0)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    attempt = ATTEMPTS[args.mode]
+
+    async with session_maker() as session:
+        original_stock = await session.scalar(
+            select(ProductModel.stock).where(ProductModel.id == args.product_id)
+        )
+        if original_stock is None:
+            raise SystemExit(f"Product {args.product_id} not found")
+        await session.execute(
+            update(ProductModel).where(ProductModel.id == args.product_id).values(stock=args.stock)
+        )
+        await session.commit()
+
+    remaining = args.buyers
+    successes = 0
+    failures = 0
+    latencies: list[float] = []
+
+    async def buyer() -> None:
+        nonlocal remaining, successes, failures
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            async with session_maker() as session:
+                if await attempt(session, args.product_id, args.quantity):
+                    await session.commit()
+                    successes += 1
+                else:
+                    await session.rollback()
+                    failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(buyer() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    async with session_maker() as session:
+        final_stock = await session.scalar(
+            select(ProductModel.stock).where(ProductModel.id == args.product_id)
+        )
+        await session.execute(
+            update(ProductModel).where(ProductModel.id == args.product_id).values(stock=original_stock)
+        )
+        await session.commit()
+    await engine.dispose()
+
+    sold = successes * args.quantity
+    written_off = args.stock - final_stock
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"mode:          {args.mode}")
+    print(f"attempts:      {len(latencies)} за {elapsed:.2f} с ({len(latencies) / elapsed:.0f} в секунду)")
+    print(f"latency:       p50 {quantiles[49] * 1e3:.1f} мс, p99 {quantiles[98] * 1e3:.1f} мс")
+    print(f"successful:    {successes}, rejected: {failures}")
+    print(f"sold units:    {sold}, written off stock: {written_off}, final stock: {final_stock}")
+    if sold != written_off or final_stock < 0:
+        print(f"OVERSOLD:      продано на {sold - written_off} единиц больше, чем списано со склада")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--product-id", type=int, required=True, help="ID активного товара")
+    parser.add_argument("--stock", type=int, default=1000, help="Начальный остаток на время теста")
+    parser.add_argument("--buyers", type=int, default=5000, help="Всего попыток купить")
+    parser.add_argument("--quantity", type=int, default=1, help="Единиц товара в одной покупке")
+    parser.add_argument("--concurrency", type=int, default=50, help="Параллельных покупателей (соединений)")
+    parser.add_argument("--mode", choices=sorted(ATTEMPTS), default="atomic")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Сравнение сериализации страницы GET /products/ на одних и тех же данных:
+стандартный путь (ORM-объекты -> ProductList(from_attributes) -> jsonable_encoder -> json.dumps)
+и быстрый режим fast=true (словари колонок -> TypeAdapter -> JSON-байты).
+
+Запуск из корня проекта: python -m benchmarks.product_list_serialization
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models.products import Product as ProductModel
+from app.routers.products import render_product_list
+from app.schemas import Product as ProductSchema, ProductList
+
+
+def make_rows(count: int) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": index,
+            "name": f"Товар {index}",
+            "description": "Описание товара " * 10,
+            "price": Decimal("1999.90") + index,
+            "image_url": f"https://cdn.example.com/products/{index}.jpg",
+            "stock": index % 50,
+            "category_id": index % 12 + 1,
+            "rating": 4.25,
+            "is_active": True,
+            "seller_id": 1,
+            "updated_at": now,
+        }
+        for index in range(1, count + 1)
+    ]
+
+
+def page(items: list) -> dict:
+    return {
+        "items": items,
+        "total": 12000,
+        "total_mode": "exact",
+        "page": 1,
+        "page_size": len(items),
+        "next_cursor": None,
+    }
+
+
+def current_path(products: list[ProductModel]) -> bytes:
+    # То, что делает FastAPI для response_model=ProductList с ORM-объектами
+    value = ProductList.model_validate(page(products), from_attributes=True)
+    content = jsonable_encoder(value.model_dump(mode="json"))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def fast_path(rows: list[dict]) -> bytes:
+    columns = ProductSchema.model_fields
+    return render_product_list(page([{name: row[name] for name in columns} for row in rows]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100, help="Товаров на странице")
+    parser.add_argument("--repeat", type=int, default=2000, help="Сериализаций на замер")
+    args = parser.parse_args()
+
+    rows = make_rows(args.items)
+    products = [ProductModel(**row) for row in rows]
+    assert json.loads(current_path(products)) == json.loads(fast_path(rows))
+
+    for name, func, data in (("current", current_path, products), ("fast", fast_path, rows)):
+        best = min(timeit.repeat(lambda: func(data), number=args.repeat, repeat=5))
+        print(f"{name:>8}: {best / args.repeat * 1e6:9.1f} µs на страницу из {args.items} товаров")
+
+
+if __name__ == "__main__":
+    main()